@@ -6,6 +6,10 @@ import sys
 
 def main():
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    # Как и в yatube/wsgi.py: без подмены distutils из setuptools, пока
+    # стандартный distutils есть (до Python 3.12).
+    if sys.version_info < (3, 12):
+        os.environ.setdefault('SETUPTOOLS_USE_DISTUTILS', 'stdlib')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import Group, Post, Task
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -17,5 +17,13 @@ class GroupsAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created',)
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupsAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,307 @@
+"""JSON API: посты, группы, комментарии, лента подписок и подписки.
+
+Списки листаются курсором (?after=/?before=, ?limit=), ?fields=
+оставляет в объектах только перечисленные поля. Каждый ответ несёт
+ETag, посчитанный до сериализации по дешёвому состоянию: адресу
+запроса и ключам объектов страницы с их card_version, который
+сдвигают правки, комментарии и миниатюры. Поэтому 304 на условный
+GET обходится без сборки тела. Last-Modified берётся из поколений
+разделов posts.pages, которые сигналы сдвигают при любой записи,
+а не из дат публикации: правка и удаление его тоже двигают. Когда
+поколений нет, например с DummyCache, Last-Modified не отдаётся и
+перепроверять можно только по If-None-Match.
+
+Единственная запись — follow/authors/: подписка и отписка пачкой
+по именам пользователей, например при онбординге новичка.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_POST, require_safe
+
+from . import follows, pages
+from .feeds import follow_feed
+from .models import Group, Post, User
+from .paginators import FEED_KEYS, CursorPaginator
+
+COMMENT_KEYS = ('created', 'pk')
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'comments_count': lambda post: post.comments_count,
+    'url': lambda post: reverse('post', kwargs={
+        'username': post.author.username, 'post_id': post.pk}),
+}
+GROUP_FIELDS = {
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+    'url': lambda group: reverse('group_slug', kwargs={'slug': group.slug}),
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created,
+    'author': lambda comment: comment.author.username,
+}
+AUTHOR_FIELDS = {
+    'username': lambda author: author.username,
+    'score': lambda author: author.score,
+    'url': lambda author: reverse(
+        'profile', kwargs={'username': author.username}),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def json_errors(view):
+    """Ошибки и 404 отдаются в JSON, а не страницей."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            error = ApiError('Не найдено', status=404)
+        except ApiError as raised:
+            error = raised
+        return JsonResponse({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def api_view(view):
+    """Только GET/HEAD, ошибки — в JSON."""
+    return require_safe(json_errors(view))
+
+
+def current_user(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Требуется вход', status=403)
+    return request.user
+
+
+def selected_fields(request, available):
+    value = request.GET.get('fields')
+    if not value:
+        return tuple(available)
+    fields = tuple(
+        name.strip() for name in value.split(',') if name.strip())
+    unknown = set(fields) - set(available)
+    if unknown:
+        raise ApiError(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown)))
+    return fields
+
+
+def serialize(obj, available, fields):
+    return {field: available[field](obj) for field in fields}
+
+
+def page_size(request):
+    value = request.GET.get('limit')
+    if value is None:
+        return settings.PER_PAGE
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise ApiError(
+            f'limit должен быть от 1 до {settings.API_MAX_PAGE_SIZE}')
+    return limit
+
+
+def version(obj):
+    """Ключ объекта в состоянии ответа: pk и card_version, если есть."""
+    return obj.pk, getattr(obj, 'card_version', None)
+
+
+def conditional_response(request, state, render, sections=None):
+    """JSON-ответ или 304 по состоянию, посчитанному до сериализации.
+
+    render() строит тело и вызывается, только если 304 не вышел.
+    sections — разделы posts.pages, из поколений которых получается
+    Last-Modified; None — ответ зависит от пользователя, и даты нет.
+    """
+    last_modified = None
+    if sections is not None:
+        generations = pages.generations(pages.ALL, *sections)
+        state = state, generations
+        if None not in generations:
+            last_modified = max(generations) // 1000
+    etag = quote_etag(hashlib.md5(
+        repr((request.get_full_path(), state)).encode()).hexdigest())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(render())
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def page_response(request, object_list, available, keys=FEED_KEYS,
+                  sections=None):
+    """Страница списка по курсору; keys — ключи сортировки курсора."""
+    fields = selected_fields(request, available)
+    paginator = CursorPaginator(object_list, page_size(request), keys)
+    page = paginator.page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return conditional_response(
+        request,
+        ([version(obj) for obj in page],
+         page.has_next(), page.has_previous()),
+        lambda: {
+            'results': [serialize(obj, available, fields) for obj in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        },
+        sections,
+    )
+
+
+@api_view
+def post_list(request):
+    return page_response(
+        request, Post.objects.for_feed(), POST_FIELDS,
+        sections=[pages.INDEX])
+
+
+@api_view
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    fields = selected_fields(request, POST_FIELDS)
+    return conditional_response(
+        request,
+        version(post),
+        lambda: serialize(post, POST_FIELDS, fields),
+        [pages.profile_section(post.author.username)],
+    )
+
+
+@api_view
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
+    return page_response(
+        request,
+        post.comments.select_related('author'),
+        COMMENT_FIELDS,
+        COMMENT_KEYS,
+        [pages.profile_section(post.author.username)],
+    )
+
+
+@api_view
+def group_list(request):
+    fields = selected_fields(request, GROUP_FIELDS)
+    groups = list(Group.objects.order_by('title'))
+    return conditional_response(
+        request,
+        [(group.slug, group.title, group.description) for group in groups],
+        lambda: {'results': [serialize(group, GROUP_FIELDS, fields)
+                             for group in groups]},
+        [],
+    )
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        request, group.posts.for_feed(), POST_FIELDS,
+        sections=[pages.group_section(slug)])
+
+
+@api_view
+def user_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request, author.posts.for_feed(), POST_FIELDS,
+        sections=[pages.profile_section(username)])
+
+
+@api_view
+def follow_list(request):
+    post_list, keys = follow_feed(current_user(request))
+    return page_response(request, post_list.for_feed(), POST_FIELDS, keys)
+
+
+def usernames(data, key):
+    value = data.get(key, [])
+    if not isinstance(value, list) or not all(
+            isinstance(name, str) for name in value):
+        raise ApiError(f'{key} должен быть списком имён пользователей')
+    return value
+
+
+@require_POST
+@json_errors
+def follow_authors(request):
+    """Подписка и отписка пачкой: {"follow": [...], "unfollow": [...]}.
+
+    Отвечает, на кого подписка появилась и от кого снята; уже
+    существующие подписки и неизвестные имена не считаются ошибкой,
+    последние возвращаются в not_found.
+    """
+    user = current_user(request)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise ApiError('Тело запроса должно быть JSON-объектом')
+    to_follow = usernames(data, 'follow')
+    to_unfollow = usernames(data, 'unfollow')
+    if set(to_follow) & set(to_unfollow):
+        raise ApiError('Нельзя подписаться и отписаться одновременно')
+    if len(to_follow) + len(to_unfollow) > settings.API_MAX_FOLLOW_BATCH:
+        raise ApiError(
+            f'Не больше {settings.API_MAX_FOLLOW_BATCH} имён за запрос')
+
+    ids = dict(User.objects.filter(
+        username__in=to_follow + to_unfollow,
+    ).values_list('username', 'pk'))
+    names = {pk: name for name, pk in ids.items()}
+    with transaction.atomic():
+        followed = follows.follow(
+            user, [ids[name] for name in to_follow if name in ids])
+        unfollowed = follows.unfollow(
+            user, [ids[name] for name in to_unfollow if name in ids])
+    return JsonResponse({
+        'followed': sorted(names[pk] for pk in followed),
+        'unfollowed': sorted(names[pk] for pk in unfollowed),
+        'not_found': sorted(set(to_follow + to_unfollow) - set(ids)),
+    })
+
+
+@api_view
+def suggested_authors(request):
+    fields = selected_fields(request, AUTHOR_FIELDS)
+    authors = follows.suggested_authors(
+        current_user(request), page_size(request))
+    return conditional_response(
+        request,
+        [(author.pk, author.score) for author in authors],
+        lambda: {'results': [serialize(author, AUTHOR_FIELDS, fields)
+                             for author in authors]},
+    )
@@ -0,0 +1,33 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.post_list, name='posts'),
+    path('posts/<int:post_id>/', api.post_detail, name='post'),
+    path(
+        'posts/<int:post_id>/comments/',
+        api.comment_list,
+        name='comments'
+    ),
+    path('groups/', api.group_list, name='groups'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path(
+        'users/<str:username>/posts/',
+        api.user_posts,
+        name='user_posts'
+    ),
+    path('follow/', api.follow_list, name='follow'),
+    path(
+        'follow/authors/',
+        api.follow_authors,
+        name='follow_authors'
+    ),
+    path(
+        'follow/suggested/',
+        api.suggested_authors,
+        name='suggested_authors'
+    ),
+]
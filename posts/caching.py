@@ -0,0 +1,33 @@
+"""Защита от «стада» при истечении ключей кэша.
+
+Вместе со значением хранится время его вычисления и срок жизни.
+Каждый читатель с вероятностью, растущей к концу срока, пересчитывает
+значение заранее (probabilistic early expiration), поэтому ключ
+обновляет один запрос, а не все воркеры разом в момент истечения.
+Ключ с timeout=None живёт вечно и заранее не пересчитывается.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+BETA = 1.0
+
+
+def get_or_refresh(key, compute, timeout, beta=BETA):
+    """Значение по ключу; compute() вызывается при промахе или заранее."""
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expiry = entry
+        if expiry is None:
+            return value
+        jitter = delta * beta * -math.log(1.0 - random.random())
+        if time.time() + jitter < expiry:
+            return value
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    expiry = None if timeout is None else started + timeout
+    cache.set(key, (value, delta, expiry), timeout)
+    return value
@@ -0,0 +1,155 @@
+"""Валидаторы HTTP-кэша для страниц, открытых анонимам.
+
+До рендера страница дешёво считает своё состояние: дату последней
+публикации — MAX(pub_date) по индексу ленты, без прохода по таблице, —
+и поколения своего раздела из posts.pages, которые сигналы сдвигают
+при публикации, правке и удалении поста, комментариях и правке
+группы. Из состояния получаются ETag и Last-Modified, и условный GET
+отвечает 304 без рендера. Поколения — метки времени, поэтому
+Last-Modified тоже двигается при правке и удалении. Как и кэш
+страниц, поколения должны лежать в общем для воркеров кэше.
+Анонимные ответы помечаются public, чтобы их мог хранить CDN или
+обратный прокси; ответы залогиненным зависят от пользователя и
+остаются private. Vary: Cookie разводит эти случаи.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from . import pages
+from .models import Comment, Group, Post, User
+
+
+def first_row(queryset):
+    """Первая строка без ORDER BY pk, который добавил бы .first()."""
+    return next(iter(queryset[:1]), None)
+
+
+def last_published(posts):
+    return posts.order_by().aggregate(last=Max('pub_date'))['last']
+
+
+def section_state(section, published, **state):
+    """(Last-Modified, состояние) раздела по дате публикации и его
+    поколениям."""
+    shared, own = pages.generations(pages.ALL, section)
+    changes = [published] + [
+        datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+        for value in (shared, own) if value is not None
+    ]
+    state.update(published=published, generations=(shared, own))
+    return max(filter(None, changes), default=None), state
+
+
+def index_state(request):
+    return section_state(pages.INDEX, last_published(Post.objects))
+
+
+def group_state(request, slug):
+    group = first_row(Group.objects.filter(slug=slug).order_by().values(
+        'pk', 'title', 'description'))
+    if group is None:
+        return None
+    return section_state(
+        pages.group_section(slug),
+        last_published(Post.objects.filter(group_id=group['pk'])),
+        **group,
+    )
+
+
+def profile_state(request, username):
+    author = first_row(User.objects.filter(
+        username=username,
+    ).order_by().values(
+        'pk', 'first_name', 'last_name', 'counters__posts_count',
+        'counters__followers_count', 'counters__following_count',
+    ))
+    if author is None:
+        return None
+    return section_state(
+        pages.profile_section(username),
+        last_published(Post.objects.filter(author_id=author['pk'])),
+        **author,
+    )
+
+
+def post_state(request, username, post_id):
+    state = first_row(Post.objects.filter(
+        pk=post_id, author__username=username,
+    ).order_by().values(
+        'pub_date', 'card_version',
+        'author__first_name', 'author__last_name',
+        'author__counters__posts_count',
+    ))
+    if state is None:
+        return None
+    # Отдельный агрегат без GROUP BY по всем полям поста читается
+    # по индексу комментариев.
+    state['last_comment'] = Comment.objects.filter(
+        post_id=post_id,
+    ).order_by().aggregate(last=Max('created'))['last']
+    # Правку поста ловят card_version в ETag и поколение профиля
+    # автора в Last-Modified.
+    return section_state(
+        pages.profile_section(username),
+        max(filter(None, (state['pub_date'], state['last_comment']))),
+        **state,
+    )
+
+
+def conditional_page(state):
+    """Отвечает анонимам 304 по ETag/Last-Modified из state.
+
+    state(request, *args, **kwargs) возвращает пару (дата последнего
+    изменения, словарь состояния) или None, если объекта страницы нет.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.user.is_authenticated
+                    or request.method not in ('GET', 'HEAD')):
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Cookie',))
+                return response
+
+            found = state(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            last_modified, parts = found
+            etag = quote_etag(hashlib.md5(
+                repr(sorted(parts.items())).encode()).hexdigest())
+            timestamp = None
+            if last_modified is not None:
+                timestamp = int(last_modified.timestamp())
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            if response.cookies:
+                # Ответ с Set-Cookie нельзя раздавать другим клиентам.
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.EDGE_CACHE_SECONDS,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,146 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по входящим лентам (FeedEntry) подписчиков
+автора, поэтому страница ленты читается по индексу (user, post), а не
+через JOIN с posts_follow. Авторы, у которых подписчиков не меньше
+FEED_FANOUT_LIMIT, не раскладываются: их посты подмешиваются при чтении.
+Когда такой автор опускается ниже порога, его свежие посты
+раскладываются по лентам всех подписчиков задним числом, иначе
+опубликованное за время популярности пропало бы из лент.
+Ленты, собранные до включения FOLLOW_FEED_MATERIALIZED, заполняет
+команда rebuild_follow_feeds.
+"""
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import FeedEntry, Follow, Post, User, UserCounter
+
+POST_KEYS = ('pub_date', 'pk')
+INBOX_KEYS = ('feed_pub_date', 'feed_post')
+
+
+def is_fanout_author(author_id):
+    """Раскладываются ли посты автора по лентам подписчиков."""
+    counters = UserCounter.objects.for_user(User(pk=author_id))
+    return counters.followers_count < settings.FEED_FANOUT_LIMIT
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if not settings.FOLLOW_FEED_MATERIALIZED:
+        return
+    if not is_fanout_author(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids),
+        ignore_conflicts=True,
+    )
+
+
+def dropped_below_limit(author_ids):
+    """Авторы, которые после отписки опустились ниже FEED_FANOUT_LIMIT.
+
+    Отписка снимает по одному подписчику, поэтому порог пересекли
+    ровно те, у кого подписчиков теперь FEED_FANOUT_LIMIT - 1.
+    """
+    return list(UserCounter.objects.filter(
+        user_id__in=author_ids,
+        followers_count=settings.FEED_FANOUT_LIMIT - 1,
+    ).values_list('user_id', flat=True))
+
+
+def backfill_followers(author_id):
+    """Раскладывает свежие посты автора по лентам всех подписчиков."""
+    if not settings.FOLLOW_FEED_MATERIALIZED:
+        return
+    if not is_fanout_author(author_id):
+        return
+    posts = list(Post.objects.filter(
+        author_id=author_id,
+    ).order_by('-pub_date').values_list(
+        'pk', 'pub_date')[:settings.FEED_BACKFILL_SIZE])
+    follower_ids = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in follower_ids.iterator():
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts),
+            ignore_conflicts=True,
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту свежие посты автора после подписки."""
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id, author_ids):
+    """Добавляет в ленту свежие посты сразу многих новых авторов.
+
+    Берутся FEED_BACKFILL_SIZE самых свежих постов всех авторов
+    вместе — ровно то, что видно в начале ленты; авторы с огромным
+    числом подписчиков пропускаются, их посты подмешиваются при чтении.
+    """
+    if not settings.FOLLOW_FEED_MATERIALIZED:
+        return
+    popular = UserCounter.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gte=settings.FEED_FANOUT_LIMIT,
+    ).values('user_id')
+    posts = Post.objects.filter(
+        author_id__in=author_ids,
+    ).exclude(
+        author_id__in=popular,
+    ).order_by('-pub_date').values_list('pk', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts[:settings.FEED_BACKFILL_SIZE]),
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    trim_many(user_id, [author_id])
+
+
+def trim_many(user_id, author_ids):
+    """Убирает из ленты посты всех авторов, от которых отписались."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id__in=author_ids).delete()
+
+
+def follow_feed(user):
+    """Посты ленты подписок и ключ, по которому их листать.
+
+    Для обычных авторов — чтение входящей ленты по индексу
+    (user, pub_date, post) без сортировки, для авторов с огромным
+    числом подписчиков — fan-out on read. Счётчики авторов без строки
+    UserCounter сперва пересчитываются: иначе такой автор сошёл бы
+    за раскладываемого, даже будучи популярным.
+    """
+    if not settings.FOLLOW_FEED_MATERIALIZED:
+        return Post.objects.filter(author__following__user=user), POST_KEYS
+    inbox = FeedEntry.objects.filter(user=user).values('post')
+    popular = []
+    candidates = Follow.objects.filter(user=user).filter(
+        Q(author__counters__isnull=True)
+        | Q(author__counters__followers_count__gte=(
+            settings.FEED_FANOUT_LIMIT)),
+    ).values_list('author_id', 'author__counters__followers_count')
+    for author_id, followers_count in candidates:
+        if followers_count is None:
+            followers_count = UserCounter.objects.recount(
+                User(pk=author_id)).followers_count
+        if followers_count >= settings.FEED_FANOUT_LIMIT:
+            popular.append(author_id)
+    if not popular:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post'),
+        ), INBOX_KEYS
+    return Post.objects.filter(
+        Q(pk__in=inbox) | Q(author__in=popular)), POST_KEYS
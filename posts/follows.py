@@ -0,0 +1,103 @@
+"""Подписки на авторов — по одной и пачкой.
+
+Подписка вставляется одним bulk_create(ignore_conflicts=True),
+отписка — одним DELETE по множеству авторов. Перед этим берётся
+блокировка строки счётчиков подписчика: две параллельные подписки
+одного пользователя идут по очереди, и вторая видит, что подписка
+уже есть, — счётчики и уведомления учитываются только для
+действительно новых строк. Сигналы Follow при этом учёт не ведут, и
+счётчики, ленты и уведомления сервис обновляет сам, тоже пачкой:
+подписка на 200 авторов стоит столько же запросов, сколько на одного.
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Value
+
+from . import feeds, notifications, tasks
+from .models import Follow, User, UserCounter
+from .signals import follows_muted
+
+
+def lock_counters(user):
+    """Блокирует строку счётчиков user до конца транзакции.
+
+    Строка создаётся, если её ещё нет. В SQLite select_for_update
+    ничего не делает, но там писатели и так идут по одному.
+    """
+    UserCounter.objects.for_user(user)
+    list(UserCounter.objects.select_for_update().filter(user=user))
+
+
+@transaction.atomic
+def follow(user, author_ids):
+    """Подписывает user на авторов; возвращает id новых подписок."""
+    author_ids = set(author_ids) - {user.pk}
+    if not author_ids:
+        return []
+    lock_counters(user)
+    followed = Follow.objects.filter(user=user).values('author_id')
+    new_ids = sorted(User.objects.filter(
+        pk__in=author_ids,
+    ).exclude(
+        pk__in=followed,
+    ).values_list('pk', flat=True))
+    if not new_ids:
+        return []
+    Follow.objects.bulk_create(
+        (Follow(user=user, author_id=author_id) for author_id in new_ids),
+        ignore_conflicts=True,
+    )
+    UserCounter.objects.bump(user.pk, following_count=len(new_ids))
+    UserCounter.objects.bump_many(new_ids, followers_count=1)
+    tasks.backfill_many.delay(user.pk, new_ids)
+    notifications.record_follows(user.pk, new_ids)
+    return new_ids
+
+
+@transaction.atomic
+def unfollow(user, author_ids):
+    """Отписывает user от авторов; возвращает id снятых подписок."""
+    author_ids = set(author_ids)
+    if not author_ids:
+        return []
+    lock_counters(user)
+    follows = Follow.objects.filter(user=user, author_id__in=author_ids)
+    removed = sorted(follows.values_list('author_id', flat=True))
+    if not removed:
+        return []
+    with follows_muted():
+        follows.delete()
+    UserCounter.objects.bump(user.pk, following_count=-len(removed))
+    UserCounter.objects.bump_many(removed, followers_count=-1)
+    dropped = feeds.dropped_below_limit(removed)
+    if dropped:
+        tasks.backfill_followers.delay(dropped)
+    tasks.trim_many.delay(user.pk, removed)
+    notifications.forget_follows(user.pk, removed)
+    return removed
+
+
+def suggested_authors(user, limit=10):
+    """Авторы, которых читают те, на кого подписан user.
+
+    Кандидаты и их score — сколько подписок user читают автора —
+    считаются одним агрегирующим запросом по графу подписок. Если
+    кандидатов меньше limit, например у новичка без подписок,
+    остаток добирается самыми читаемыми авторами со score 0.
+    """
+    candidates = User.objects.exclude(pk=user.pk).exclude(
+        following__user=user)
+    suggested = list(candidates.filter(
+        following__user__following__user=user,
+    ).annotate(
+        score=Count('following'),
+    ).order_by('-score', 'username')[:limit])
+    if len(suggested) < limit:
+        suggested += candidates.exclude(
+            pk__in=[author.pk for author in suggested],
+        ).annotate(
+            score=Value(0, output_field=IntegerField()),
+        ).order_by(
+            F('counters__followers_count').desc(nulls_last=True),
+            'username',
+        )[:limit - len(suggested)]
+    return suggested
@@ -0,0 +1,173 @@
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import tasks
+from posts.models import Task, User
+
+from .bench_views import git_commit, percentile
+
+
+def summary(latencies, errors, seconds):
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / seconds, 1),
+    }
+    if latencies:
+        result.update({
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+        })
+    return result
+
+
+class ErrorCount(logging.Handler):
+    """Считает ошибки задач, не печатая их трассировки."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность index, пока другие потоки '
+        'публикуют посты через new_post'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        writers = list(User.objects.order_by('pk')[:options['writers']])
+        if len(writers) < options['writers']:
+            raise CommandError(
+                'Не хватает пользователей: запустите seed_data')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+
+        task_errors = ErrorCount()
+        task_logger = logging.getLogger(tasks.__name__)
+        task_logger.addHandler(task_errors)
+        task_logger.propagate = False
+        since = timezone.now()
+
+        stop = threading.Event()
+        stats = {'index': ([], []), 'new_post': ([], [])}
+        threads = []
+        for _ in range(options['readers']):
+            threads.append(threading.Thread(
+                target=self.work,
+                args=(Client(), 'get', reverse('index'), None,
+                      stats['index'], stop),
+            ))
+        for user in writers:
+            client = Client()
+            client.force_login(user)
+            threads.append(threading.Thread(
+                target=self.work,
+                args=(client, 'post', reverse('new_post'),
+                      {'text': 'Нагрузочный тест'}, stats['new_post'], stop),
+            ))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Задачи пула, поставленные под нагрузкой, тоже входят в замер.
+        tasks.shutdown()
+        task_logger.removeHandler(task_errors)
+        task_logger.propagate = True
+
+        results = {
+            'commit': git_commit(),
+            'profile': settings.DATABASE_PROFILE,
+            'journal_mode': journal_mode,
+            'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'views': {
+                name: summary(latencies, len(errors), elapsed)
+                for name, (latencies, errors) in stats.items()
+            },
+            'tasks': {
+                'backend': settings.TASK_BACKEND,
+                'errors': task_errors.count,
+                'queued': Task.objects.filter(created__gte=since).count(),
+            },
+        }
+        for name, result in results['views'].items():
+            self.stdout.write(f'{name}: {result}')
+        self.stdout.write(f'tasks: {results["tasks"]}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline), results)
+
+    def work(self, client, method, url, data, stats, stop):
+        """Шлёт запросы, пока не выставлен stop; у потока своё соединение."""
+        latencies, errors = stats
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    response = getattr(client, method)(url, data)
+                except DatabaseError as error:
+                    errors.append(str(error))
+                    continue
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+
+    def compare(self, baseline, results):
+        self.stdout.write(
+            f'Сравнение с {baseline.get("commit")} '
+            f'(профиль {baseline.get("profile")}, '
+            f'журнал {baseline.get("journal_mode")})')
+        for name, current in results['views'].items():
+            previous = baseline['views'].get(name)
+            if previous is None:
+                continue
+            changes = []
+            for key in ('rps', 'errors', 'p50_ms', 'p95_ms', 'p99_ms'):
+                before, after = previous.get(key), current.get(key)
+                if before is None or after is None:
+                    continue
+                delta = (after - before) / before * 100 if before else 0
+                changes.append(f'{key} {before} -> {after} ({delta:+.0f}%)')
+            self.stdout.write(f'{name}: ' + ', '.join(changes))
+        previous = baseline.get('tasks')
+        if previous is not None:
+            current = results['tasks']
+            self.stdout.write(
+                f'tasks: errors {previous["errors"]} -> {current["errors"]}, '
+                f'queued {previous["queued"]} -> {current["queued"]}')
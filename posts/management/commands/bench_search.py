@@ -0,0 +1,177 @@
+import json
+import math
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from posts.models import Post, User
+from posts.paginators import cached_count
+from posts.search import (
+    GROUP_WEIGHT, IDF_SCALE, TEXT_WEIGHT, index_post, search_posts, tokenize,
+)
+
+# Редкое слово, которого нет в словаре seed_data: запрос по нему
+# находит ровно --matches постов при любом размере базы.
+NEEDLE = 'жираф'
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench_search',
+    }
+}
+
+
+def like_search(query, limit=10):
+    """Тот же поиск без индекса: LIKE по каждому терму и ранжирование.
+
+    Кандидаты отбираются LIKE '%терм%' по тексту и названию группы и
+    токенизируются заново, чтобы результат и порядок совпали с
+    search_posts. LIKE в SQLite не сводит регистр кириллицы и не
+    заменяет ё, поэтому совпадение гарантировано только для текстов
+    в нижнем регистре без ё, как у seed_data.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    total = cached_count('all', Post.objects.all()) or 1
+    scores = None
+    for term in terms:
+        rows = Post.objects.filter(
+            Q(text__icontains=term) | Q(group__title__icontains=term)
+        ).values_list('pk', 'text', 'group__title')
+        weights = {}
+        for pk, text, title in rows:
+            weight = TEXT_WEIGHT * tokenize(text).count(term)
+            if title:
+                weight += GROUP_WEIGHT * tokenize(title).count(term)
+            if weight:
+                weights[pk] = weight
+        idf = 1 + int(IDF_SCALE * math.log(max(total / max(
+            len(weights), 1), 1)))
+        term_scores = {pk: weight * idf for pk, weight in weights.items()}
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {
+                pk: score + term_scores[pk]
+                for pk, score in scores.items() if pk in term_scores
+            }
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    return [pk for pk, _ in ranked[:limit]]
+
+
+def indexed_search(query, limit=10):
+    return list(search_posts(query).order_by(
+        '-score', '-pk').values_list('pk', flat=True)[:limit])
+
+
+def best_of(search, query, repeat):
+    """Лучшее время поиска в миллисекундах и его результат."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, found
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу с тем же поиском через LIKE на базах '
+        'seed_data нескольких размеров во временной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*', default=[NEEDLE, 'кот лес'],
+            help=f'Поисковые запросы; {NEEDLE!r} — редкое слово')
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[2000, 8000, 32000],
+            help='Сколько постов создать seed_data для каждого замера')
+        parser.add_argument(
+            '--matches', type=int, default=20,
+            help=f'Сколько постов со словом {NEEDLE!r} добавить')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON')
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options['sizes']))
+        if not sizes or sizes[0] < 1:
+            raise CommandError('--sizes должны быть положительными')
+        # Замеры идут во временной базе: текущая не трогается.
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES=BENCH_CACHES):
+                results = [self.measure(size, options) for size in sizes]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results, options['queries'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+    def measure(self, size, options):
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        call_command(
+            'seed_data', f'--posts={size}', f'--users={max(size // 50, 10)}',
+            '--groups=10', '--follows=0', '--comments=0', '--with-search',
+            stdout=StringIO(),
+        )
+        author = User.objects.order_by('pk').first()
+        # bulk_create в SQLite не возвращает pk: посты читаются заново.
+        Post.objects.bulk_create(
+            Post(author=author, text=f'дом {NEEDLE} номер {num}')
+            for num in range(options['matches']))
+        for post in Post.objects.filter(text__contains=NEEDLE):
+            index_post(post)
+        posts = Post.objects.count()
+        timings = {}
+        for query in options['queries']:
+            indexed, indexed_found = best_of(
+                indexed_search, query, options['repeat'])
+            like, like_found = best_of(
+                like_search, query, options['repeat'])
+            timings[query] = {
+                'index_ms': round(indexed, 3),
+                'like_ms': round(like, 3),
+                'same': indexed_found == like_found,
+            }
+        return {'posts': posts, 'queries': timings}
+
+    def report(self, results, queries):
+        self.stdout.write(
+            f'{"постов":>8}  {"запрос":<12} {"индекс, мс":>11} '
+            f'{"LIKE, мс":>10}  результат')
+        for result in results:
+            for query, timing in result['queries'].items():
+                same = 'совпал' if timing['same'] else 'РАЗНЫЙ'
+                self.stdout.write(
+                    f'{result["posts"]:>8}  {query:<12} '
+                    f'{timing["index_ms"]:>11.2f} {timing["like_ms"]:>10.2f}'
+                    f'  {same}')
+        if len(results) < 2:
+            return
+        first, last = results[0], results[-1]
+        self.stdout.write(
+            f'Рост при ×{last["posts"] / first["posts"]:.1f} постов:')
+        for query in queries:
+            before, after = first['queries'][query], last['queries'][query]
+            self.stdout.write(
+                f'  {query!r}: индекс '
+                f'×{after["index_ms"] / before["index_ms"]:.1f}, LIKE '
+                f'×{after["like_ms"] / before["like_ms"]:.1f}')
+        if not all(timing['same'] for result in results
+                   for timing in result['queries'].values()):
+            self.stderr.write(
+                'Результаты индекса и LIKE разошлись: сравнение неверно')
@@ -0,0 +1,171 @@
+import json
+import random
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(int(round(share * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summary(latencies, queries):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries_p50': percentile(queries, 0.50),
+        'queries_max': max(queries),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержку и число запросов основных страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        follower_ids = list(
+            Follow.objects.values_list('user_id', flat=True)[:1000])
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        group_slugs = list(Group.objects.values_list('slug', flat=True)[:100])
+        if not post_ids or not follower_ids or not group_slugs:
+            raise CommandError(
+                'Нужны посты, группы и подписки: запустите seed_data')
+        self.users = {
+            user.pk: user for user in User.objects.filter(pk__in=follower_ids)
+        }
+        self.posts = {
+            post.pk: post
+            for post in Post.objects.select_related('author').filter(
+                pk__in=post_ids)
+        }
+        self.group_slugs = group_slugs
+
+        scenarios = {
+            'index': self.index,
+            'group_posts': self.group_posts,
+            'profile': self.profile,
+            'post_view': self.post_view,
+            'follow_index': self.follow_index,
+            'new_post': self.new_post,
+            'add_comment': self.add_comment,
+        }
+        results = {
+            'commit': git_commit(),
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+            'views': {},
+        }
+        for name, scenario in scenarios.items():
+            latencies, queries = [], []
+            for _ in range(options['requests']):
+                client, method, url, data = scenario()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    latencies.append(
+                        (time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: {url} ответил {response.status_code}')
+                queries.append(len(captured))
+            results['views'][name] = summary(latencies, queries)
+            self.stdout.write(f'{name}: {results["views"][name]}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline), results)
+
+    def compare(self, baseline, results):
+        self.stdout.write(
+            f'Сравнение с {baseline.get("commit")} '
+            f'(постов: {baseline.get("posts")})')
+        for name, current in results['views'].items():
+            previous = baseline['views'].get(name)
+            if previous is None:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_p50'):
+                before, after = previous[key], current[key]
+                delta = (after - before) / before * 100 if before else 0
+                changes.append(f'{key} {before} -> {after} ({delta:+.0f}%)')
+            self.stdout.write(f'{name}: ' + ', '.join(changes))
+
+    def client_for(self, user=None):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def random_post(self):
+        return self.posts[self.rng.choice(list(self.posts))]
+
+    def random_user(self):
+        return self.users[self.rng.choice(list(self.users))]
+
+    def index(self):
+        return self.client_for(), 'get', reverse('index'), None
+
+    def group_posts(self):
+        slug = self.rng.choice(self.group_slugs)
+        url = reverse('group_slug', kwargs={'slug': slug})
+        return self.client_for(), 'get', url, None
+
+    def profile(self):
+        author = self.random_post().author
+        url = reverse('profile', kwargs={'username': author.username})
+        return self.client_for(), 'get', url, None
+
+    def post_view(self):
+        post = self.random_post()
+        url = reverse('post', kwargs={
+            'username': post.author.username, 'post_id': post.pk})
+        return self.client_for(), 'get', url, None
+
+    def follow_index(self):
+        client = self.client_for(self.random_user())
+        return client, 'get', reverse('follow_index'), None
+
+    def new_post(self):
+        client = self.client_for(self.random_user())
+        return client, 'post', reverse('new_post'), {'text': 'Бенчмарк'}
+
+    def add_comment(self):
+        post = self.random_post()
+        url = reverse('add_comment', kwargs={
+            'username': post.author.username, 'post_id': post.pk})
+        client = self.client_for(self.random_user())
+        return client, 'post', url, {'text': 'Бенчмарк'}
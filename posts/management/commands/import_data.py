@@ -0,0 +1,230 @@
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import pages, tasks, transfer
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def parse_date(value):
+    moment = parse_datetime(value) if value else None
+    if moment is None:
+        return timezone.now()
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты, комментарии или подписки из NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=transfer.KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--images', help='Каталог с картинками постов из выгрузки')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Пропустить записи, загруженные до контрольной точки')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс')
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        fmt = transfer.detect_format(path, options['format'])
+        self.images = options['images']
+        self.started = time.monotonic()
+
+        state = {'position': 0, 'offset': 0, 'loaded': 0, 'skipped': 0}
+        if options['resume']:
+            checkpoint = transfer.load_checkpoint(path)
+            if checkpoint is None:
+                raise CommandError(f'Нет контрольной точки для {path}')
+            if 'offset' not in checkpoint:
+                raise CommandError(
+                    f'В контрольной точке {path} нет смещения в файле')
+            state.update(checkpoint)
+        self.skipped = state['skipped']
+
+        load_batch = getattr(self, f'load_{kind}')
+        with open(path, 'rb') as stream:
+            records = transfer.read_records(stream, fmt, state['offset'])
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    loaded = load_batch([record for record, _ in batch])
+                state['position'] += len(batch)
+                state['offset'] = batch[-1][1]
+                state['loaded'] += loaded
+                state['skipped'] = self.skipped
+                transfer.save_checkpoint(path, state)
+                self.log(
+                    f'Прочитано: {state["position"]}, '
+                    f'загружено: {state["loaded"]}')
+        transfer.drop_checkpoint(path)
+        self.reset_sequences()
+
+        if not options['no_rebuild']:
+            call_command('recount_counters', stdout=self.stdout)
+            if kind in ('posts', 'follows'):
+                call_command('rebuild_follow_feeds', stdout=self.stdout)
+            if kind == 'posts':
+                call_command('rebuild_search_index', stdout=self.stdout)
+        pages.purge()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {state["loaded"]}, '
+            f'пропущено: {self.skipped}'))
+
+    def log(self, message):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
+
+    def reset_sequences(self):
+        """Сдвигает счётчики id за перенесённые явные id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def free_ids(self, model, batch):
+        """Записи пачки, чьи id ещё не заняты; остальные пропускаются.
+
+        bulk_create(ignore_conflicts=True) молча отбросил бы такие
+        строки, и они попали бы в отчёт как загруженные.
+        """
+        taken = set(model.objects.filter(
+            pk__in=[int(record['id']) for record in batch],
+        ).values_list('pk', flat=True))
+        records, collided = [], []
+        for record in batch:
+            pk = int(record['id'])
+            if pk in taken:
+                collided.append(pk)
+                continue
+            taken.add(pk)
+            records.append(record)
+        if collided:
+            self.skipped += len(collided)
+            shown = ', '.join(map(str, collided[:10]))
+            more = '…' if len(collided) > 10 else ''
+            self.log(
+                f'Пропущено {len(collided)} с занятыми id: {shown}{more}')
+        return records
+
+    def user_ids(self, usernames):
+        """id пользователей по именам; недостающие создаются без пароля."""
+        usernames = set(filter(None, usernames))
+        found = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        missing = usernames - set(found)
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=name, password=password) for name in missing],
+                ignore_conflicts=True,
+            )
+            found.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+        return found
+
+    def group_ids(self, slugs):
+        slugs = set(filter(None, slugs))
+        found = dict(Group.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+        missing = slugs - set(found)
+        if missing:
+            Group.objects.bulk_create(
+                [Group(slug=slug, title=slug, description='')
+                 for slug in missing],
+                ignore_conflicts=True,
+            )
+            found.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+        return found
+
+    def image_name(self, name):
+        """Имя картинки в хранилище, при --images — после копирования."""
+        if not name or not self.images:
+            return name
+        source = os.path.join(self.images, name)
+        if default_storage.exists(name) or not os.path.exists(source):
+            return name
+        with open(source, 'rb') as image:
+            return default_storage.save(name, File(image))
+
+    def load_posts(self, batch):
+        batch = self.free_ids(Post, batch)
+        authors = self.user_ids(record['author'] for record in batch)
+        groups = self.group_ids(record['group'] for record in batch)
+        posts = [
+            Post(
+                id=int(record['id']),
+                author_id=authors[record['author']],
+                group_id=groups.get(record['group']),
+                text=record['text'] or '',
+                pub_date=parse_date(record['pub_date']),
+                image=self.image_name(record['image']),
+            )
+            for record in batch
+        ]
+        transfer.create_with_dates(Post, posts)
+        for post in posts:
+            if post.image:
+                tasks.generate_thumbnail.delay(post.pk, post.image.name)
+        return len(posts)
+
+    def load_comments(self, batch):
+        batch = self.free_ids(Comment, batch)
+        authors = self.user_ids(record['author'] for record in batch)
+        post_ids = set(Post.objects.filter(
+            pk__in=[int(record['post']) for record in batch]
+        ).values_list('pk', flat=True))
+        comments = []
+        for record in batch:
+            if int(record['post']) not in post_ids:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                id=int(record['id']),
+                post_id=int(record['post']),
+                author_id=authors[record['author']],
+                text=record['text'] or '',
+                created=parse_date(record['created']),
+            ))
+        transfer.create_with_dates(Comment, comments)
+        return len(comments)
+
+    def load_follows(self, batch):
+        users = self.user_ids(
+            name for record in batch
+            for name in (record['user'], record['author']))
+        pairs = set(Follow.objects.filter(
+            user_id__in={users[record['user']] for record in batch},
+            author_id__in={users[record['author']] for record in batch},
+        ).values_list('user_id', 'author_id'))
+        follows = []
+        for record in batch:
+            pair = users[record['user']], users[record['author']]
+            if record['user'] == record['author'] or pair in pairs:
+                self.skipped += 1
+                continue
+            pairs.add(pair)
+            follows.append(Follow(user_id=pair[0], author_id=pair[1]))
+        Follow.objects.bulk_create(follows)
+        return len(follows)
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import tasks
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди в базе (TASK_BACKEND = database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить созревшие задачи и выйти')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда задач нет')
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        while True:
+            job = tasks.claim()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            if tasks.execute(job):
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{job}: {job.last_error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'))
@@ -0,0 +1,150 @@
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_LINE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def parse_importtime(text):
+    """Строки -X importtime: [(модуль, собств. мкс, всего мкс, глубина)]."""
+    rows = []
+    for line in text.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, total, indent, name = match.groups()
+            rows.append((name, int(own), int(total), len(indent) // 2))
+    return rows
+
+
+def importers(rows, index):
+    """Цепочка модулей, импортировавших rows[index], до верхнего уровня.
+
+    Python печатает модуль после всех его зависимостей, поэтому
+    импортёр — ближайшая следующая строка с меньшей глубиной.
+    """
+    chain = []
+    depth = rows[index][3]
+    for name, _, _, level in rows[index + 1:]:
+        if level < depth:
+            chain.append(name)
+            depth = level
+    return chain
+
+
+def subtree(rows, module):
+    """Строки импорта module верхнего уровня вместе с его зависимостями.
+
+    Модули самого интерпретатора (site, encodings) в замер не входят.
+    """
+    for index in range(len(rows) - 1, -1, -1):
+        if rows[index][0] == module and rows[index][3] == 0:
+            start = index
+            while start and rows[start - 1][3] > 0:
+                start -= 1
+            return rows[start:index + 1]
+    return []
+
+
+def is_within(name, module):
+    return name == module or name.startswith(module + '.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет импорт модуля при старте воркера через -X importtime '
+        'и проверяет бюджет и ленивые модули'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='yatube.wsgi')
+        parser.add_argument(
+            '--runs', type=int, default=3,
+            help='Сколько раз запускать; в отчёт идёт самый быстрый')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument(
+            '--budget', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+            help='Бюджет в мс; 0 отключает проверку')
+        parser.add_argument(
+            '--forbid', action='append',
+            help='Модуль, который не должен импортироваться при старте; '
+                 'по умолчанию STARTUP_LAZY_MODULES')
+        parser.add_argument(
+            '--env', action='append', default=[], metavar='KEY=VALUE',
+            help='Переменная окружения для замера: YATUBE_TEMPLATE_CACHE=1')
+        parser.add_argument(
+            '--output', help='Куда записать сырой вывод -X importtime')
+
+    def handle(self, *args, **options):
+        module = options['module']
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+        for item in options['env']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'--env ждёт KEY=VALUE, а не {item}')
+            env[key] = value
+
+        best = None
+        for _ in range(max(options['runs'], 1)):
+            raw = self.run(module, env)
+            rows = subtree(parse_importtime(raw), module)
+            if not rows:
+                raise CommandError(f'В выводе нет импорта {module}')
+            total = rows[-1][2]
+            if best is None or total < best[0]:
+                best = (total, rows, raw)
+        total, rows, raw = best
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(raw)
+        self.report(module, total, rows, options['top'])
+
+        forbidden = options['forbid'] or settings.STARTUP_LAZY_MODULES
+        problems = []
+        for index, (name, _, _, _) in enumerate(rows):
+            if any(is_within(name, lazy) for lazy in forbidden):
+                chain = ' ← '.join([name] + importers(rows, index))
+                problems.append(f'Импортирован при старте: {chain}')
+        budget = options['budget']
+        if budget and total / 1000 > budget:
+            problems.append(
+                f'{module} импортируется {total / 1000:.1f} мс, '
+                f'бюджет {budget:.0f} мс')
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'Проблем при старте: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{module}: {total / 1000:.1f} мс, в пределах бюджета'))
+
+    def run(self, module, env):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            tail = result.stderr.strip().splitlines()[-1:]
+            raise CommandError(
+                f'import {module} упал: {" ".join(tail) or result.returncode}')
+        return result.stderr
+
+    def report(self, module, total, rows, top):
+        packages = Counter()
+        for name, own, _, _ in rows:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(f'{module}: {total / 1000:.1f} мс')
+        self.stdout.write('По пакетам, собственное время:')
+        for package, own in packages.most_common(top):
+            self.stdout.write(f'{own / 1000:12.1f} мс  {package}')
+        self.stdout.write(f'{"собств., мс":>12} {"всего, мс":>12}  модуль')
+        for name, own, cumulative, _ in sorted(
+                rows, key=lambda row: -row[1])[:top]:
+            self.stdout.write(
+                f'{own / 1000:12.2f} {cumulative / 1000:12.2f}  {name}')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import resolve
+
+from posts.models import User
+from yatube import template_profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Профилирует рендер шаблонов на заданных страницах и пишет '
+        'collapsed stacks для flame graph'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+', help='Адреса страниц: / /group/cats/')
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument(
+            '--user', help='Имя пользователя, от которого открывать страницы')
+        parser.add_argument('--output', default='templates.folded')
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+            client.force_login(user)
+
+        profile = template_profile.TemplateProfile()
+        for path in options['paths']:
+            view = resolve(path.split('?')[0]).view_name
+            for _ in range(options['requests']):
+                with template_profile.collect() as recording:
+                    response = client.get(path)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{path} ответил {response.status_code}')
+                profile.merge(view, recording)
+
+        with open(options['output'], 'w') as output:
+            output.write(profile.collapsed())
+        self.stdout.write(profile.summary())
+        self.stdout.write(self.style.SUCCESS(
+            f'Стеки записаны в {options["output"]}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        FeedEntry.objects.all().delete()
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        for num, (user_id, author_id) in enumerate(
+                follows.iterator(), start=1):
+            feeds.backfill(user_id, author_id)
+            if num % 1000 == 0:
+                self.stdout.write(f'Обработано подписок: {num}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Post, SearchTerm
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс по всем постам'
+
+    def handle(self, *args, **options):
+        SearchTerm.objects.all().delete()
+        posts = Post.objects.select_related('group').order_by('pk')
+        for num, post in enumerate(posts.iterator(), start=1):
+            search.index_post(post)
+            if num % 1000 == 0:
+                self.stdout.write(f'Проиндексировано постов: {num}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в индексе: {SearchTerm.objects.count()}'))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, User, UserCounter
+
+
+def count_of(queryset, field):
+    """Подзапрос COUNT(*) по queryset, сгруппированному по field."""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число разошедшихся счётчиков'
+        )
+
+    def handle(self, *args, **options):
+        real_posts = Post.objects.annotate(
+            real_comments=count_of(Comment.objects, 'post'))
+        drifted_posts = real_posts.exclude(
+            comments_count=F('real_comments')).count()
+
+        users = User.objects.annotate(
+            real_posts=count_of(Post.objects, 'author'),
+            real_followers=count_of(Follow.objects, 'author'),
+            real_following=count_of(Follow.objects, 'user'),
+        )
+        drifted_users = users.filter(counters__isnull=False).exclude(
+            Q(counters__posts_count=F('real_posts')),
+            Q(counters__followers_count=F('real_followers')),
+            Q(counters__following_count=F('real_following')),
+        ).count()
+        missing_users = users.filter(counters__isnull=True).count()
+
+        self.stdout.write(
+            f'Постов с неверным числом комментариев: {drifted_posts}\n'
+            f'Пользователей с неверными счётчиками: {drifted_users}\n'
+            f'Пользователей без счётчиков: {missing_users}'
+        )
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            Post.objects.update(
+                comments_count=count_of(Comment.objects, 'post'))
+            UserCounter.objects.bulk_create(
+                [UserCounter(user_id=pk) for pk in users.filter(
+                    counters__isnull=True).values_list('pk', flat=True)])
+            UserCounter.objects.update(
+                posts_count=count_of(Post.objects, 'author'),
+                followers_count=count_of(Follow.objects, 'author'),
+                following_count=count_of(Follow.objects, 'user'),
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
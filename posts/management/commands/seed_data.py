@@ -0,0 +1,168 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'кот собака дом лес река гора птица рыба солнце луна город море '
+    'книга музыка поезд дорога утро вечер зима лето друг работа сад '
+    'дождь снег небо поле цветок окно чай кофе письмо фото'
+).split()
+
+
+def power_law_weights(count, alpha):
+    """Накопленные веса с хвостом Парето: немногие получают почти всё."""
+    ranks = range(1, count + 1)
+    return list(accumulate(1 / (rank ** alpha) for rank in ranks))
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими пользователями и постами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя')
+        parser.add_argument(
+            '--comments', type=int, default=2,
+            help='Среднее число комментариев к посту')
+        parser.add_argument('--alpha', type=float, default=1.1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--with-feeds', action='store_true',
+            help='Собрать материализованные ленты подписок')
+        parser.add_argument(
+            '--with-search', action='store_true',
+            help='Построить поисковый индекс')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        # Авторы упорядочены по популярности: первые пишут больше всех
+        # и собирают больше всех подписчиков.
+        weights = power_law_weights(len(user_ids), options['alpha'])
+        post_ids = self.create_posts(
+            options['posts'], user_ids, weights, group_ids)
+        self.create_follows(options['follows'], user_ids, weights)
+        self.create_comments(options['comments'], post_ids, user_ids)
+
+        call_command('recount_counters', stdout=self.stdout)
+        if options['with_feeds']:
+            call_command('rebuild_follow_feeds', stdout=self.stdout)
+        if options['with_search']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.log('Готово')
+
+    def log(self, message):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
+
+    def bulk(self, model, objects, total):
+        batch = []
+        created = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                created += self.flush(model, batch)
+                batch = []
+                self.log(f'{model.__name__}: {created} из {total}')
+        if batch:
+            created += self.flush(model, batch)
+        self.log(f'{model.__name__}: {created}')
+
+    def flush(self, model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
+
+    def new_ids(self, model, before):
+        return list(model.objects.filter(pk__gt=before).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def last_id(self, model):
+        last = model.objects.order_by('-pk').values_list('pk', flat=True)
+        return last.first() or 0
+
+    def create_users(self, count):
+        before = self.last_id(User)
+        password = make_password(None)
+        self.bulk(User, (
+            User(username=f'seed{before + num}', password=password)
+            for num in range(count)
+        ), count)
+        return self.new_ids(User, before)
+
+    def create_groups(self, count):
+        before = self.last_id(Group)
+        self.bulk(Group, (
+            Group(
+                title=f'Группа {before + num}',
+                slug=f'seed-{before + num}',
+                description=text(self.rng, 12),
+            )
+            for num in range(count)
+        ), count)
+        return self.new_ids(Group, before)
+
+    def create_posts(self, count, user_ids, weights, group_ids):
+        before = self.last_id(Post)
+        authors = self.rng.choices(user_ids, cum_weights=weights, k=count)
+        self.bulk(Post, (
+            Post(
+                author_id=author_id,
+                group_id=(
+                    self.rng.choice(group_ids)
+                    if group_ids and self.rng.random() < 0.5 else None),
+                text=text(self.rng, self.rng.randint(5, 60)),
+            )
+            for author_id in authors
+        ), count)
+        return self.new_ids(Post, before)
+
+    def create_follows(self, average, user_ids, weights):
+        if not average:
+            return
+        total = average * len(user_ids)
+
+        def follows():
+            for user_id in user_ids:
+                count = min(
+                    int(self.rng.expovariate(1 / average)), len(user_ids))
+                authors = set(self.rng.choices(
+                    user_ids, cum_weights=weights, k=count))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk(Follow, follows(), total)
+
+    def create_comments(self, average, post_ids, user_ids):
+        if not average or not post_ids:
+            return
+        total = average * len(post_ids)
+        self.bulk(Comment, (
+            Comment(
+                post_id=self.rng.choice(post_ids),
+                author_id=self.rng.choice(user_ids),
+                text=text(self.rng, self.rng.randint(3, 20)),
+            )
+            for _ in range(total)
+        ), total)
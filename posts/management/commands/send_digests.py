@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+
+
+class Command(BaseCommand):
+    help = 'Рассылает дайджесты о новых подписчиках и комментариях'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--every', type=float,
+            help='Повторять раз в столько секунд, а не один раз')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = notifications.send_digests(options['batch_size'])
+            self.stdout.write(f'Отправлено дайджестов: {sent}')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
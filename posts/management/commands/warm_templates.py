@@ -0,0 +1,73 @@
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from yatube import template_cache
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает и проверяет все шаблоны проекта; с --benchmark '
+        'сравнивает холодный и прогретый рендер'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Проверять и шаблоны сторонних приложений')
+        parser.add_argument('--benchmark', action='store_true')
+        parser.add_argument(
+            '--url', default='/about/author/',
+            help='Страница для замера первого запроса')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['url'], options['repeat'])
+
+        started = time.perf_counter()
+        loaded, errors = template_cache.warm(options['all'])
+        elapsed = (time.perf_counter() - started) * 1000
+        for name, error in errors:
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'Шаблонов с ошибками: {len(errors)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено шаблонов: {loaded} за {elapsed:.1f} мс'))
+
+    def benchmark(self, url, repeat):
+        engines = template_cache.django_engines()
+        if not any(map(template_cache.is_cached, engines)):
+            self.stdout.write(self.style.WARNING(
+                'Кэширующий загрузчик выключен: включите '
+                'YATUBE_TEMPLATE_CACHE=1, иначе прогрев ничего не даёт'))
+        client = Client()
+        results = {key: [] for key in (
+            'load_cold', 'load_warm', 'request_cold', 'request_warm')}
+        for _ in range(repeat):
+            for engine in engines:
+                template_cache.reset(engine)
+            results['load_cold'].append(timed(template_cache.warm))
+            results['load_warm'].append(timed(template_cache.warm))
+            for engine in engines:
+                template_cache.reset(engine)
+            for key in ('request_cold', 'request_warm'):
+                started = time.perf_counter()
+                response = client.get(url)
+                results[key].append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(f'{url} ответил {response.status_code}')
+        self.stdout.write(
+            f'Все шаблоны: холодные {median(results["load_cold"]):.2f} мс, '
+            f'прогретые {median(results["load_warm"]):.2f} мс')
+        self.stdout.write(
+            f'{url}: первый запрос {median(results["request_cold"]):.2f} мс, '
+            f'повторный {median(results["request_warm"]):.2f} мс')
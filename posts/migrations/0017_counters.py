@@ -0,0 +1,47 @@
+# Generated by Django 2.2.6 on 2026-10-17 23:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_comments_count(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    comments = Comment.objects.filter(
+        post=models.OuterRef('pk')
+    ).values('post').annotate(total=models.Count('pk')).values('total')
+    Post.objects.update(
+        comments_count=Coalesce(models.Subquery(comments), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(help_text='Чьи счётчики', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, help_text='Число постов пользователя')),
+                ('followers_count', models.PositiveIntegerField(default=0, help_text='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='Число подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Число комментариев к посту'),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_object'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-17 23:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_feed_pub_date(apps, schema_editor):
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry.objects.update(pub_date=models.Subquery(
+        Post.objects.filter(pk=models.OuterRef('post')).values('pub_date')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Дата публикации поста'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_feed_pub_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='feed_entry_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_feed_idx'),
+        ),
+    ]
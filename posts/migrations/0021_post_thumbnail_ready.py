@@ -0,0 +1,26 @@
+# Generated by Django 2.2.6 on 2026-10-17 23:31
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Старые миниатюры sorl по-прежнему дорежет при первом показе.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').exclude(image__isnull=True).update(
+        thumbnail_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_card_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_ready',
+            field=models.BooleanField(default=False, editable=False, help_text='Миниатюра картинки уже нарезана'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.6 on 2026-10-18 00:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_searchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Имя зарегистрированной задачи', max_length=100)),
+                ('payload', models.TextField(help_text='Аргументы задачи в JSON')),
+                ('status', models.CharField(choices=[('pending', 'Ждёт'), ('running', 'Выполняется'), ('failed', 'Провалена')], default='pending', help_text='Состояние задачи', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Сколько раз задачу брали в работу')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Не раньше какого момента выполнять')),
+                ('last_error', models.TextField(blank=True, help_text='Ошибка последней попытки')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Когда задача поставлена')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_at'], name='task_due_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.6 on 2026-10-18 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0023_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('follow', 'Новый подписчик'), ('comment', 'Новый комментарий')], help_text='Тип события', max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Когда произошло событие')),
+                ('sent_at', models.DateTimeField(blank=True, help_text='Когда ушло в дайджесте', null=True)),
+                ('actor', models.ForeignKey(help_text='Кто подписался или прокомментировал', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('comment', models.ForeignKey(blank=True, help_text='Комментарий, если событие о нём', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='posts.Comment')),
+                ('recipient', models.ForeignKey(help_text='Кому придёт дайджест', on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['sent_at', 'recipient'], name='notification_pending_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -20,6 +23,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что нужно карточке поста, за один запрос."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -51,13 +60,54 @@ class Post(models.Model):
         null=True,
         help_text='Загрузите картинку'
     )
+    thumbnail_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text='Миниатюра картинки уже нарезана'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Число комментариев к посту'
+    )
+    card_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Версия закэшированной карточки поста'
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    # Поля, которые меняются только UPDATE ... SET f = f + 1 из сигналов.
+    COUNTER_FIELDS = ('comments_count', 'card_version')
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_feed_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Иначе сохранение загруженного ранее поста затрёт счётчики,
+        # которые успели измениться в базе.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -85,6 +135,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -109,3 +163,223 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_object')
         ]
+
+
+class FeedEntry(models.Model):
+    """Пост во входящей ленте подписчика (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        help_text='Чья лента'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        help_text='Пост в ленте'
+    )
+    pub_date = models.DateTimeField(
+        help_text='Дата публикации поста'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_user_idx'),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса: терм встречается в посте."""
+    term = models.CharField(
+        max_length=64,
+        help_text='Основа слова'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        help_text='Пост с этим словом'
+    )
+    weight = models.PositiveIntegerField(
+        help_text='Вес терма в посте'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'], name='unique_search_term')
+        ]
+
+
+class UserCounterManager(models.Manager):
+    def for_user(self, user):
+        """Счётчики пользователя; пересчитываются, если строки ещё нет."""
+        try:
+            return user.counters
+        except UserCounter.DoesNotExist:
+            return self.recount(user)
+
+    def recount(self, user):
+        counter, _ = self.update_or_create(
+            user=user,
+            defaults={
+                'posts_count': user.posts.count(),
+                'followers_count': user.following.count(),
+                'following_count': user.follower.count(),
+            }
+        )
+        user.counters = counter
+        return counter
+
+    def bump(self, user_id, **deltas):
+        """Атомарно сдвигает счётчики: bump(user_id, posts_count=1).
+
+        Если строки ещё нет, ничего не делает — for_user посчитает её
+        с нуля при первом чтении.
+        """
+        self.bump_many([user_id], **deltas)
+
+    def bump_many(self, user_ids, **deltas):
+        """Сдвигает счётчики сразу многих пользователей одним UPDATE."""
+        self.filter(user_id__in=user_ids).update(**{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики для страницы профиля."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        help_text='Чьи счётчики'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Число постов пользователя'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Число подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Число подписок'
+    )
+
+    objects = UserCounterManager()
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Task(models.Model):
+    """Отложенная работа для воркера process_tasks."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ждёт'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Провалена'),
+    )
+
+    name = models.CharField(
+        max_length=100,
+        help_text='Имя зарегистрированной задачи'
+    )
+    payload = models.TextField(
+        help_text='Аргументы задачи в JSON'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        help_text='Состояние задачи'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text='Сколько раз задачу брали в работу'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='Не раньше какого момента выполнять'
+    )
+    last_error = models.TextField(
+        blank=True,
+        help_text='Ошибка последней попытки'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        help_text='Когда задача поставлена'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class Notification(models.Model):
+    """Событие для письма-дайджеста: подписка или комментарий."""
+    FOLLOW = 'follow'
+    COMMENT = 'comment'
+    KINDS = (
+        (FOLLOW, 'Новый подписчик'),
+        (COMMENT, 'Новый комментарий'),
+    )
+
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        help_text='Кому придёт дайджест'
+    )
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        help_text='Кто подписался или прокомментировал'
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        help_text='Тип события'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        blank=True,
+        null=True,
+        help_text='Комментарий, если событие о нём'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        help_text='Когда произошло событие'
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Когда ушло в дайджесте'
+    )
+
+    class Meta:
+        ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['sent_at', 'recipient'],
+                name='notification_pending_idx'),
+        ]
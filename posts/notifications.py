@@ -0,0 +1,129 @@
+"""Письма-дайджесты о подписках и комментариях.
+
+Сигналы только записывают события в Notification. Команда
+send_digests по расписанию собирает неотправленные события в одно
+письмо на получателя и отправляет их пачками по DIGEST_BATCH_SIZE
+через одно соединение get_connection(): SMTP-сервер видит одну сессию
+на рассылку, а не соединение на каждое событие.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification
+
+DIGEST_TEMPLATE = 'posts/digest_email.txt'
+
+
+def record_follow(follow):
+    record_follows(follow.user_id, [follow.author_id])
+
+
+def record_follows(user_id, author_ids):
+    """Подписка на многих авторов сразу — одним INSERT."""
+    Notification.objects.bulk_create(
+        Notification(
+            recipient_id=author_id,
+            actor_id=user_id,
+            kind=Notification.FOLLOW,
+        )
+        for author_id in author_ids
+    )
+
+
+def forget_follow(follow):
+    forget_follows(follow.user_id, [follow.author_id])
+
+
+def forget_follows(user_id, author_ids):
+    """Отписка до дайджеста: о подписке писать уже незачем."""
+    Notification.objects.filter(
+        recipient_id__in=author_ids,
+        actor_id=user_id,
+        kind=Notification.FOLLOW,
+        sent_at__isnull=True,
+    ).delete()
+
+
+def record_comment(comment):
+    recipient_id = comment.post.author_id
+    if recipient_id == comment.author_id:
+        return
+    Notification.objects.create(
+        recipient_id=recipient_id,
+        actor_id=comment.author_id,
+        kind=Notification.COMMENT,
+        comment=comment,
+    )
+
+
+def digest_message(recipient, notifications):
+    followers = [
+        item.actor for item in notifications
+        if item.kind == Notification.FOLLOW
+    ]
+    comments = [
+        item.comment for item in notifications
+        if item.kind == Notification.COMMENT
+    ]
+    body = render_to_string(DIGEST_TEMPLATE, {
+        'recipient': recipient,
+        'followers': followers,
+        'comments': comments,
+    })
+    return EmailMessage(
+        f'Yatube: новых событий — {len(notifications)}',
+        body,
+        to=[recipient.email],
+    )
+
+
+def send_digests(batch_size=None):
+    """Отправляет все накопившиеся дайджесты; возвращает число писем.
+
+    Получатели берутся пачками по batch_size, события пачки
+    помечаются отправленными только после send_messages, так что
+    сбой SMTP не теряет их, а оставляет до следующего запуска.
+    """
+    batch_size = batch_size or settings.DIGEST_BATCH_SIZE
+    # Без адреса письмо не отправить, а события копились бы вечно.
+    Notification.objects.filter(
+        sent_at__isnull=True, recipient__email='').delete()
+    Notification.objects.filter(
+        sent_at__lt=timezone.now() - timedelta(
+            days=settings.NOTIFICATION_RETENTION_DAYS)).delete()
+
+    pending = Notification.objects.filter(sent_at__isnull=True)
+    sent = 0
+    last_recipient = 0
+    # Открытое заранее соединение send_messages не закрывает: вся
+    # рассылка идёт через одну SMTP-сессию.
+    with get_connection() as connection:
+        while True:
+            recipient_ids = list(pending.filter(
+                recipient_id__gt=last_recipient).order_by(
+                    'recipient_id').values_list(
+                        'recipient_id', flat=True).distinct()[:batch_size])
+            if not recipient_ids:
+                break
+            last_recipient = recipient_ids[-1]
+            grouped = defaultdict(list)
+            for item in pending.filter(
+                    recipient_id__in=recipient_ids).select_related(
+                        'recipient', 'actor', 'comment__author',
+                        'comment__post'):
+                grouped[item.recipient].append(item)
+            messages = [
+                digest_message(recipient, items)
+                for recipient, items in grouped.items()
+            ]
+            connection.send_messages(messages)
+            Notification.objects.filter(pk__in=[
+                item.pk for items in grouped.values() for item in items
+            ]).update(sent_at=timezone.now())
+            sent += len(messages)
+    return sent
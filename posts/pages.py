@@ -0,0 +1,166 @@
+"""Кэш целых страниц с «дырами» под пользователя.
+
+Тело ленты (index, group_posts) одинаково для всех: всё, что зависит
+от пользователя — навигация, вкладки подписок, кнопка «Редактировать»
+в карточке, — вынесено в дыры тегом {% hole %}. В теле вместо них
+остаются метки, и HoleMiddleware дорисовывает их для каждого запроса.
+Поэтому закэшированное анонимом тело годится и залогиненным.
+
+Ключ страницы — раздел (index, group:<slug>, profile:<username>),
+параметры пагинации из KEY_PARAMS и поколения: общее и раздела.
+Остальные параметры query string в ключ не входят, так что ими нельзя
+ни забить кэш, ни обойти его. Сигналы при изменении поста или
+комментария увеличивают поколения только его разделов — главной,
+группы и профиля автора, — правка группы и массовый импорт сбрасывают
+общее поколение. Метки не подделать через текст поста: он
+экранируется, и «<!--» в нём не появится.
+"""
+import hashlib
+import json
+import re
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+GENERATION_KEY = 'page_cache:generation:{}'
+ALL = 'all'
+INDEX = 'index'
+KEY_PARAMS = ('page', 'after', 'before')
+HOLE_PREFIX = b'<!--hole:'
+HOLE_RE = re.compile(rb'<!--hole:([\w=-]+)-->')
+
+
+def hole_marker(template_name, context):
+    payload = json.dumps([template_name, context], separators=(',', ':'))
+    return f'<!--hole:{urlsafe_b64encode(payload.encode()).decode()}-->'
+
+
+def fill_holes(request, content):
+    """Заменяет метки дыр шаблонами, отрисованными для request."""
+    rendered = {}
+
+    def fill(match):
+        payload = match.group(1)
+        if payload not in rendered:
+            template_name, context = json.loads(urlsafe_b64decode(payload))
+            rendered[payload] = render_to_string(
+                template_name, context, request).encode()
+        return rendered[payload]
+
+    return HOLE_RE.sub(fill, content)
+
+
+class HoleMiddleware:
+    """Дорисовывает дыры в HTML-ответах.
+
+    Стоит последним в MIDDLEWARE, чтобы заполнить тело раньше, чем
+    CommonMiddleware посчитает Content-Length.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (not response.streaming
+                and response.get('Content-Type', '').startswith('text/html')
+                and HOLE_PREFIX in response.content):
+            response.content = fill_holes(request, response.content)
+        return response
+
+
+def group_section(slug):
+    return f'group:{slug}'
+
+
+def profile_section(username):
+    return f'profile:{username}'
+
+
+def post_sections(post):
+    """Разделы, где виден пост: главная, его группа и профиль автора."""
+    sections = [INDEX, profile_section(post.author.username)]
+    if post.group_id is not None:
+        sections.append(group_section(post.group.slug))
+    return sections
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def generations(*sections):
+    """Поколения разделов; недостающие заводятся заново.
+
+    Поколение — метка времени последнего сброса в миллисекундах, а не
+    счётчик с нуля: после вытеснения ключа не оживут страницы старых
+    поколений, а conditional берёт из него Last-Modified.
+    """
+    keys = [GENERATION_KEY.format(section) for section in sections]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, now_ms(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def generation(section=ALL):
+    return generations(section)[0]
+
+
+def purge(*sections):
+    """Сбрасывает закэшированные страницы разделов, без них — все."""
+    for section in sections or (ALL,):
+        key = GENERATION_KEY.format(section)
+        current = cache.get(key) or 0
+        cache.set(key, max(now_ms(), current + 1), None)
+
+
+def purge_on_commit(*sections):
+    """Сбрасывает страницы сейчас и ещё раз после коммита.
+
+    Второй сброс убирает страницы, которые другой запрос успел
+    закэшировать по данным до коммита.
+    """
+    purge(*sections)
+    transaction.on_commit(lambda: purge(*sections))
+
+
+def page_cache_key(request, section):
+    params = [
+        (name, request.GET.getlist(name)) for name in KEY_PARAMS
+        if name in request.GET
+    ]
+    digest = hashlib.md5(json.dumps(params).encode()).hexdigest()
+    shared, own = generations(ALL, section)
+    return f'page:{shared}.{own}:{section}:{digest}'
+
+
+def cache_page_body(section):
+    """Отдаёт тело страницы из кэша, если оно там есть.
+
+    section(request, *args, **kwargs) — имя раздела страницы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or not settings.PAGE_CACHE_TIMEOUT):
+                return view(request, *args, **kwargs)
+            key = page_cache_key(request, section(request, *args, **kwargs))
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response.content, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,275 @@
+import collections.abc
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import DateField, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .caching import get_or_refresh
+
+FEED_KEYS = ('pub_date', 'pk')
+# Наибольший id, который примут SQLite и bigint PostgreSQL.
+MAX_ID = 2 ** 63 - 1
+# Сколько номеров показывать вокруг текущей страницы и у краёв.
+ON_EACH_SIDE = 2
+ON_ENDS = 1
+
+
+def encode_cursor(post, keys=FEED_KEYS):
+    """Курсор — позиция поста в ленте по ключу (pub_date, id).
+
+    Вместо даты первым ключом может быть целое число, например
+    релевантность в поиске.
+    """
+    first, pk = (getattr(post, key) for key in keys)
+    if hasattr(first, 'isoformat'):
+        first = first.isoformat()
+    value = f'{first}|{pk}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(cursor, first_type=datetime):
+    """Возвращает (первый ключ, id) или None для битого курсора.
+
+    first_type — тип первого ключа ленты: datetime или int. Курсор
+    другой ленты, например поиска на главной, тоже считается битым.
+    """
+    try:
+        first, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if not 0 < pk <= MAX_ID:
+        return None
+    if first_type is int:
+        try:
+            first = int(first)
+        except ValueError:
+            return None
+        if not -MAX_ID <= first <= MAX_ID:
+            return None
+        return first, pk
+    try:
+        pub_date = parse_datetime(first)
+    except ValueError:
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Каждая страница — это один запрос с LIMIT per_page + 1 от позиции
+    курсора, поэтому время ответа не зависит от глубины страницы.
+    keys — поля queryset, хранящие (pub_date, id) поста: их можно
+    подменить, чтобы сортировка шла по индексу другой таблицы.
+    """
+    cursor_based = True
+
+    def __init__(self, object_list, per_page, keys=FEED_KEYS):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = keys
+
+    @property
+    def first_type(self):
+        """datetime, если первый ключ — дата, иначе int (как score)."""
+        name = self.keys[0]
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            field = annotation.output_field
+        else:
+            field = self.object_list.model._meta.get_field(name)
+        return datetime if isinstance(field, DateField) else int
+
+    def decode(self, cursor):
+        return decode_cursor(cursor, self.first_type)
+
+    def _beyond(self, pub_date, pk, direction):
+        date_key, pk_key = self.keys
+        return (
+            Q(**{f'{date_key}__{direction}': pub_date})
+            | Q(**{date_key: pub_date, f'{pk_key}__{direction}': pk})
+        )
+
+    def page(self, after=None, before=None):
+        if before is not None:
+            position = self.decode(before)
+            if position is not None:
+                return self._page_before(*position)
+        position = self.decode(after) if after is not None else None
+        return self._page_after(position)
+
+    def _page_after(self, position):
+        object_list = self.object_list.order_by(
+            *(f'-{key}' for key in self.keys))
+        if position is not None:
+            object_list = object_list.filter(self._beyond(*position, 'lt'))
+        items = list(object_list[:self.per_page + 1])
+        return CursorPage(
+            items[:self.per_page],
+            self,
+            has_next=len(items) > self.per_page,
+            has_previous=position is not None,
+        )
+
+    def _page_before(self, pub_date, pk):
+        object_list = self.object_list.order_by(*self.keys).filter(
+            self._beyond(pub_date, pk, 'gt'))
+        items = list(object_list[:self.per_page + 1])
+        return CursorPage(
+            items[:self.per_page][::-1],
+            self,
+            has_next=True,
+            has_previous=len(items) > self.per_page,
+        )
+
+
+class CursorPage(collections.abc.Sequence):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.object_list[-1], self.paginator.keys)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(self.object_list[0], self.paginator.keys)
+        return None
+
+
+def cached_count(scope, queryset):
+    """Число строк queryset, закэшированное под именем scope.
+
+    Номерам страниц точность не нужна: счётчик может отставать на
+    PAGINATOR_COUNT_TIMEOUT секунд, а paginate поправляет его по
+    последней странице.
+    """
+    return get_or_refresh(
+        f'post_count:{scope}', queryset.count,
+        settings.PAGINATOR_COUNT_TIMEOUT)
+
+
+def elided_page_range(number, num_pages,
+                      on_each_side=ON_EACH_SIDE, on_ends=ON_ENDS):
+    """Номера страниц для ссылок; None — пропуск на месте многоточия.
+
+    1 … 7 8 [9] 10 11 … 500 вместо пятисот ссылок. Одну пропущенную
+    страницу многоточием не заменяем: ссылка на неё не длиннее.
+    """
+    # Три отрезка — начало, окно вокруг number и конец — без обхода
+    # всех num_pages страниц.
+    windows = (
+        (1, min(on_ends, num_pages)),
+        (max(number - on_each_side, 1),
+         min(number + on_each_side, num_pages)),
+        (max(num_pages - on_ends + 1, 1), num_pages),
+    )
+    shown = sorted({
+        candidate
+        for first, last in windows
+        for candidate in range(first, last + 1)
+    })
+    previous = 0
+    for candidate in shown:
+        if candidate == previous + 2:
+            yield previous + 1
+        elif candidate > previous + 2:
+            yield None
+        yield candidate
+        previous = candidate
+
+
+def set_count(paginator, count):
+    paginator.count = count
+    for name in ('num_pages', 'page_range'):
+        paginator.__dict__.pop(name, None)
+
+
+def approximate_page(paginator, number, count):
+    """Страница при приблизительном числе постов count.
+
+    Paginator.page() обрезал бы последнюю страницу по count, поэтому
+    срез берётся по per_page. Неполная страница сама даёт точное
+    число, а если счётчик противоречит странице — она пуста или постов
+    больше, чем он обещал, — число пересчитывается точно.
+    """
+    set_count(paginator, count)
+    try:
+        number = paginator.validate_number(number)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+    per_page = paginator.per_page
+    items = list(paginator.object_list[
+        (number - 1) * per_page:number * per_page])
+    seen = (number - 1) * per_page + len(items)
+    if items and len(items) < per_page:
+        set_count(paginator, seen)
+    elif not items or seen > paginator.count:
+        set_count(paginator, paginator.object_list.count())
+        if number > paginator.num_pages:
+            return paginator.page(paginator.num_pages)
+    return paginator._get_page(items, number, paginator)
+
+
+def paginate(request, object_list, keys=FEED_KEYS, count=None):
+    """Страница ленты для запроса.
+
+    ?after=/?before= обслуживаются курсорной пагинацией, старые ссылки
+    вида ?page=N — обычным Paginator. На номерных страницах ссылка
+    «Следующая» тоже ведёт по курсору, чтобы листание вглубь не
+    упиралось в OFFSET.
+
+    count — функция, возвращающая приблизительное число постов: с ней
+    номера страниц не требуют COUNT(*) на каждый запрос.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after is not None or before is not None:
+        paginator = CursorPaginator(object_list, settings.PER_PAGE, keys)
+        return paginator.page(after=after, before=before), paginator
+    paginator = Paginator(
+        object_list.order_by(*(f'-{key}' for key in keys)),
+        settings.PER_PAGE
+    )
+    if count is None:
+        page = paginator.get_page(request.GET.get('page'))
+    else:
+        page = approximate_page(paginator, request.GET.get('page'), count())
+    page.page_links = list(
+        elided_page_range(page.number, paginator.num_pages))
+    if page.has_next():
+        page.next_cursor = encode_cursor(page[-1], keys)
+    return page, paginator
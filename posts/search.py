@@ -0,0 +1,112 @@
+"""Полнотекстовый поиск по постам на инвертированном индексе.
+
+Текст поста и название его группы режутся на слова, слова сводятся
+к основе лёгким стеммером для русского языка и складываются в таблицу
+SearchTerm (терм, пост, вес). Запрос читает только записи своих термов
+по индексу, поэтому не зависит от общего числа постов, в отличие от
+LIKE '%слово%'.
+"""
+import math
+import re
+from collections import Counter
+
+from django.db.models import (Case, Count, F, IntegerField, OuterRef,
+                              Subquery, Sum, Value, When)
+
+from .models import Post, SearchTerm
+from .paginators import cached_count
+
+SEARCH_KEYS = ('score', 'pk')
+TEXT_WEIGHT = 1
+GROUP_WEIGHT = 2
+IDF_SCALE = 100
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'ли', 'если', 'уже', 'или',
+    'ни', 'быть', 'был', 'до', 'вас', 'нибудь', 'это', 'the', 'and', 'of',
+    'to', 'in', 'is', 'it',
+))
+# Окончания, от длинных к коротким: срезается первое подошедшее.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ого', 'его', 'ому',
+    'ему', 'ыми', 'ими', 'ешь', 'ишь', 'ете', 'ите', 'ает', 'яет', 'ают',
+    'яют', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею', 'ах', 'ях',
+    'ам', 'ям', 'ов', 'ев', 'ия', 'ья', 'ье', 'ии', 'ью', 'ть', 'ла', 'ли',
+    'ло', 'ет', 'ют', 'ут', 'ит', 'ат', 'ят', 'а', 'я', 'о', 'е', 'и', 'ы',
+    'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+MAX_TERM = SearchTerm._meta.get_field('term').max_length
+
+
+def stem(word):
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Основы значимых слов текста."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [
+        stem(word)[:MAX_TERM] for word in words
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def index_post(post):
+    """Пересобирает записи индекса для поста."""
+    weights = Counter()
+    for term in tokenize(post.text):
+        weights[term] += TEXT_WEIGHT
+    if post.group_id is not None:
+        for term in tokenize(post.group.title):
+            weights[term] += GROUP_WEIGHT
+    SearchTerm.objects.filter(post=post).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(term=term, post=post, weight=weight)
+        for term, weight in weights.items()
+    )
+
+
+def search_posts(query):
+    """Посты, содержащие все слова запроса, с релевантностью в score.
+
+    Релевантность — сумма весов термов, умноженных на их idf. Число
+    документов N для idf — закэшированное число постов, то же, что у
+    номеров страниц главной: Max('pk') после удалений его завышал.
+    """
+    nothing = Post.objects.none().annotate(
+        score=Value(0, output_field=IntegerField()))
+    terms = set(tokenize(query))
+    if not terms:
+        return nothing
+    postings = SearchTerm.objects.filter(term__in=terms)
+    frequency = dict(
+        postings.order_by().values('term').annotate(
+            posts=Count('post')).values_list('term', 'posts')
+    )
+    if len(frequency) < len(terms):
+        return nothing
+    total = cached_count('all', Post.objects.all()) or 1
+    weight = Case(
+        *(When(term=term, then=F('weight') * (1 + int(
+            IDF_SCALE * math.log(max(total / posts, 1)))))
+          for term, posts in frequency.items()),
+        output_field=IntegerField(),
+    )
+    scores = postings.filter(post=OuterRef('pk')).order_by().values(
+        'post').annotate(score=Sum(weight)).values('score')
+    matched = postings.order_by().values('post').annotate(
+        terms=Count('term')).filter(terms=len(terms)).values('post')
+    return Post.objects.filter(pk__in=matched).annotate(
+        score=Subquery(scores, output_field=IntegerField()))
@@ -0,0 +1,154 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import feeds, notifications, pages, tasks
+from .models import Comment, Follow, Group, Post, UserCounter
+
+_state = threading.local()
+
+
+@contextmanager
+def follows_muted():
+    """Сигналы Follow внутри блока не ведут учёт: его пачкой ведёт
+    вызывающий, как posts.follows."""
+    _state.follows_muted = True
+    try:
+        yield
+    finally:
+        _state.follows_muted = False
+
+
+def follows_counted():
+    return not getattr(_state, 'follows_muted', False)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    tasks.index_post.delay(instance.pk)
+    if instance.image and not instance.thumbnail_ready:
+        tasks.generate_thumbnail.delay(instance.pk, instance.image.name)
+    if created:
+        UserCounter.objects.bump(instance.author_id, posts_count=1)
+        tasks.fan_out.delay(instance.pk)
+    else:
+        Post.objects.filter(pk=instance.pk).update(
+            card_version=F('card_version') + 1
+        )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserCounter.objects.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1,
+            card_version=F('card_version') + 1,
+        )
+        notifications.record_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=Greatest(F('comments_count') - 1, 0),
+        card_version=F('card_version') + 1,
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        instance.posts.update(card_version=F('card_version') + 1)
+        tasks.index_group.delay(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты останутся без группы через UPDATE без сигналов на каждый
+    # пост: запоминаем их, чтобы после удаления убрать из индекса термы
+    # названия группы, и сбрасываем их карточки.
+    posts = instance.posts.all()
+    instance.indexed_post_ids = list(posts.values_list('pk', flat=True))
+    posts.update(card_version=F('card_version') + 1)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    post_ids = getattr(instance, 'indexed_post_ids', None)
+    if post_ids:
+        tasks.index_posts.delay(post_ids)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Пост, перенесённый в другую группу, пропадает из старой: её
+    # страницы тоже надо сбросить.
+    if not raw and instance.pk is not None:
+        instance.previous_group = Group.objects.filter(
+            posts__pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sections = pages.post_sections(instance)
+    previous = getattr(instance, 'previous_group', None)
+    if previous is not None and previous.pk != instance.group_id:
+        sections.append(pages.group_section(previous.slug))
+    pages.purge_on_commit(*sections)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # При удалении поста вместе с комментариями его может уже не быть,
+    # тогда страницы сбросит сигнал самого поста.
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=instance.post_id).first()
+    if post is not None:
+        pages.purge_on_commit(*pages.post_sections(post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_content_changed(sender, raw=False, **kwargs):
+    if not raw:
+        pages.purge_on_commit()
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and follows_counted():
+        UserCounter.objects.bump(instance.user_id, following_count=1)
+        UserCounter.objects.bump(instance.author_id, followers_count=1)
+        tasks.backfill.delay(instance.user_id, instance.author_id)
+        notifications.record_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if not follows_counted():
+        return
+    UserCounter.objects.bump(instance.user_id, following_count=-1)
+    UserCounter.objects.bump(instance.author_id, followers_count=-1)
+    if feeds.dropped_below_limit([instance.author_id]):
+        tasks.backfill_followers.delay([instance.author_id])
+    tasks.trim.delay(instance.user_id, instance.author_id)
+    notifications.forget_follow(instance)
@@ -0,0 +1,230 @@
+"""Очередь задач для побочных эффектов постов, комментариев и подписок.
+
+Сигналы не делают тяжёлую работу сами, а ставят задачи:
+fan_out.delay(post.pk). Куда уходит задача, решает TASK_BACKEND:
+
+* thread — после коммита уходит в пул из TASK_WORKERS потоков процесса
+  (по умолчанию);
+* database — строкой Task в той же транзакции; её выполнит воркер
+  manage.py process_tasks, когда транзакция закоммитится;
+* immediate — выполняется сразу, в том же запросе (тесты). Задача
+  идёт в своей точке сохранения: её ошибка откатывает только её
+  запросы и не ломает транзакцию вызывающего.
+
+Упавшая задача повторяется с экспоненциальной задержкой, пока не
+исчерпает TASK_MAX_ATTEMPTS попыток, а исчерпавшая остаётся в базе
+со статусом failed. Из пула потоков упавшая задача тоже переходит
+в базу, поэтому повторы переживают перезапуск процесса, и выполняет
+их process_tasks.
+
+Вне запроса задачи на SQLite идут в автокоммите. Отложенная
+транзакция, которая сначала читает, а потом пишет, получает
+«database is locked» сразу, без ожидания busy_timeout, если другой
+писатель успел закоммитить раньше. Отдельный запрос в автокоммите
+ждёт блокировку сам. Все задачи идемпотентны, поэтому повтор после
+частичного выполнения безопасен.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import feeds, search, thumbnails
+from .models import Follow, Group, Post, Task
+
+logger = logging.getLogger(__name__)
+registry = {}
+_executor = None
+
+
+def task(func):
+    """Регистрирует функцию как задачу и добавляет ей .delay(*args).
+
+    Аргументы уходят в JSON, поэтому задачам передают id, а не модели.
+    """
+    name = f'{func.__module__}.{func.__name__}'
+    registry[name] = func
+    func.task_name = name
+    func.delay = lambda *args: enqueue(name, args)
+    return func
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS,
+            thread_name_prefix='tasks',
+        )
+    return _executor
+
+
+def shutdown():
+    """Дожидается задач пула; следующая задача создаст его заново."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def retry_delay(attempts):
+    """Пауза перед следующей попыткой: 1, 2, 4, 8... × TASK_RETRY_DELAY."""
+    return settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def enqueue(name, args):
+    backend = settings.TASK_BACKEND
+    if backend == 'database':
+        Task.objects.create(name=name, payload=json.dumps(list(args)))
+    elif backend == 'thread':
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_thread, name, args))
+    else:
+        try:
+            with transaction.atomic():
+                registry[name](*args)
+        except Exception:
+            logger.exception('Задача %s%r упала', name, tuple(args))
+
+
+def isolated():
+    """Транзакция задачи вне запроса; на SQLite — автокоммит."""
+    if connection.vendor == 'sqlite':
+        return nullcontext()
+    return transaction.atomic()
+
+
+def run_in_thread(name, args):
+    """Попытка задачи в пуле; после ошибки задача уходит в базу."""
+    try:
+        with isolated():
+            registry[name](*args)
+    except Exception as error:
+        logger.exception('Задача %s%r упала в пуле', name, tuple(args))
+        Task.objects.create(
+            name=name,
+            payload=json.dumps(list(args)),
+            attempts=1,
+            run_at=timezone.now() + timedelta(seconds=retry_delay(1)),
+            last_error=f'{type(error).__name__}: {error}',
+        )
+    finally:
+        connection.close()
+
+
+def claim():
+    """Забирает одну созревшую задачу или возвращает None.
+
+    Взятая задача получает run_at = сейчас + TASK_LOCK_TIMEOUT: если
+    воркер умрёт, не дойдя до конца, после этого срока задачу заберёт
+    другой. Два воркера не возьмут одну задачу: UPDATE проверяет, что
+    run_at ещё не сдвинут.
+    """
+    now = timezone.now()
+    due = Task.objects.filter(
+        status__in=(Task.PENDING, Task.RUNNING), run_at__lte=now)
+    for pk in due.order_by('run_at', 'pk').values_list('pk', flat=True)[:10]:
+        claimed = due.filter(pk=pk).update(
+            status=Task.RUNNING,
+            run_at=now + timedelta(seconds=settings.TASK_LOCK_TIMEOUT),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def execute(job):
+    """Выполняет задачу из базы: удаляет при успехе, иначе откладывает."""
+    try:
+        with isolated():
+            registry[job.name](*json.loads(job.payload))
+    except Exception as error:
+        logger.exception('Задача %s упала', job)
+        job.last_error = f'{type(error).__name__}: {error}'
+        if job.attempts >= settings.TASK_MAX_ATTEMPTS:
+            job.status = Task.FAILED
+        else:
+            job.status = Task.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts))
+        job.save(update_fields=['status', 'run_at', 'last_error'])
+        return False
+    job.delete()
+    return True
+
+
+@task
+def generate_thumbnail(post_id, image_name):
+    thumbnails.generate(post_id, image_name)
+
+
+@task
+def fan_out(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        feeds.fan_out(post)
+
+
+@task
+def backfill(user_id, author_id):
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        feeds.backfill(user_id, author_id)
+
+
+@task
+def trim(user_id, author_id):
+    if not Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists():
+        feeds.trim(user_id, author_id)
+
+
+@task
+def backfill_many(user_id, author_ids):
+    followed = Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids,
+    ).values_list('author_id', flat=True)
+    feeds.backfill_many(user_id, list(followed))
+
+
+@task
+def trim_many(user_id, author_ids):
+    followed = set(Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids,
+    ).values_list('author_id', flat=True))
+    feeds.trim_many(user_id, set(author_ids) - followed)
+
+
+@task
+def backfill_followers(author_ids):
+    for author_id in author_ids:
+        feeds.backfill_followers(author_id)
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.select_related('group').filter(pk=post_id).first()
+    if post is not None:
+        search.index_post(post)
+
+
+@task
+def index_posts(post_ids):
+    posts = Post.objects.select_related('group').filter(pk__in=post_ids)
+    for post in posts.iterator():
+        search.index_post(post)
+
+
+@task
+def index_group(group_id):
+    group = Group.objects.filter(pk=group_id).first()
+    if group is None:
+        return
+    for post in group.posts.select_related('group').iterator():
+        search.index_post(post)
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.pages import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(template_name, **context):
+    """Место под шаблон, который рисуется заново на каждом запросе.
+
+    В context — только JSON-значения: они едут в метке внутри
+    закэшированной страницы, а пользователь и запрос берутся из
+    контекстных процессоров при заполнении.
+    """
+    return mark_safe(hole_marker(template_name, context))
@@ -0,0 +1,48 @@
+import logging
+
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+from posts.caching import get_or_refresh
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+CARD_TEMPLATE = 'includes/post_item.html'
+
+
+def card_cache_key(post):
+    return f'post_card:{post.pk}:{post.card_version}'
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кэша.
+
+    Ключ содержит card_version, которую сигналы увеличивают при
+    изменении поста, его комментариев и группы, поэтому старые
+    карточки просто перестают читаться. Кнопка «Редактировать» —
+    дыра (см. posts.pages), так что карточка одна на всех.
+    """
+    def render():
+        card = context.template.engine.get_template(CARD_TEMPLATE)
+        with context.push(post=post):
+            return card.render(context)
+
+    html = get_or_refresh(
+        card_cache_key(post), render, settings.POST_CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Миниатюра для карточки или None, пока её режет фоновый пул."""
+    if not post.image or not post.thumbnail_ready:
+        return None
+    try:
+        return thumbnails.card_thumbnail(post.image)
+    except Exception:
+        logger.exception('Миниатюра поста %s недоступна', post.pk)
+        return None
@@ -0,0 +1,343 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import pages
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, Notification, Post, User, UserCounter,
+)
+
+
+@override_settings(
+    PER_PAGE=3,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {num}')
+            for num in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_post_list_pages_by_cursor(self):
+        """Лента листается курсором без повторов и пропусков."""
+        url = reverse('api:posts')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 3)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(url, {'after': first['next']}).json()
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        self.assertIsNone(second['next'])
+        back = self.client.get(url, {'before': second['previous']}).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_post_representation(self):
+        post = self.posts[0]
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': post.pk}))
+        data = response.json()
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comments_count'], 1)
+        self.assertIsNone(data['image'])
+        self.assertEqual(data['url'], reverse('post', kwargs={
+            'username': 'author', 'post_id': post.pk}))
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,text'})
+        for post in response.json()['results']:
+            self.assertEqual(set(post), {'id', 'text'})
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_limit_is_validated(self):
+        url = reverse('api:posts')
+        self.assertEqual(
+            len(self.client.get(url, {'limit': 5}).json()['results']), 5)
+        for limit in ('0', '1000', 'много'):
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, 400)
+
+    def test_etag_revalidation(self):
+        """Повторный запрос с ETag получает 304, правка сбрасывает его."""
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        post = Post.objects.get(pk=self.posts[-1].pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_skips_serialization(self):
+        url = reverse('api:posts')
+        etag = self.client.get(url)['ETag']
+        with mock.patch('posts.api.serialize') as serialize:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        serialize.assert_not_called()
+
+    def test_no_last_modified_without_generations(self):
+        """Без общего кэша дата не отдаётся: ей нечем сдвинуться при правке"""
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': self.posts[0].pk}))
+        self.assertNotIn('Last-Modified', response)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'api',
+        }
+    })
+    def test_last_modified_revalidation(self):
+        """Правка и удаление сдвигают Last-Modified, 304 не устаревает"""
+        cache.clear()
+        post = Post.objects.get(pk=self.posts[0].pk)
+        urls = [
+            reverse('api:posts'),
+            reverse('api:post', kwargs={'post_id': post.pk}),
+            reverse('api:group_posts', kwargs={'slug': 'group'}),
+            reverse('api:user_posts', kwargs={'username': 'author'}),
+        ]
+        dates = {url: self.client.get(url)['Last-Modified'] for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                cached = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=dates[url])
+                self.assertEqual(cached.status_code, 304)
+
+        later = pages.now_ms() + 5000
+        with mock.patch.object(pages, 'now_ms', return_value=later):
+            post.text = 'Исправленный пост'
+            post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=dates[url])
+                self.assertEqual(response.status_code, 200)
+
+        url = urls[0]
+        date = self.client.get(url)['Last-Modified']
+        with mock.patch.object(pages, 'now_ms', return_value=later + 5000):
+            Post.objects.get(pk=self.posts[-1].pk).delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=date)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comments_groups_and_profiles(self):
+        post = self.posts[0]
+        comments = self.client.get(
+            reverse('api:comments', kwargs={'post_id': post.pk})).json()
+        self.assertEqual(
+            comments['results'][0]['text'], 'Комментарий')
+        groups = self.client.get(reverse('api:groups')).json()
+        self.assertEqual(groups['results'][0]['slug'], 'group')
+        group_posts = self.client.get(
+            reverse('api:group_posts', kwargs={'slug': 'group'})).json()
+        self.assertEqual(len(group_posts['results']), 3)
+        user_posts = self.client.get(
+            reverse('api:user_posts', kwargs={'username': 'reader'})).json()
+        self.assertEqual(user_posts['results'], [])
+
+    def test_follow_feed(self):
+        url = reverse('api:follow')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.reader)
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'after': first['next']}).json()
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+
+    def test_errors_are_json(self):
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': 999}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Не найдено'})
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class FollowApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='reader')
+        cls.authors = [
+            User.objects.create(username=f'author{num:02}')
+            for num in range(25)
+        ]
+        for user in [cls.reader] + cls.authors:
+            UserCounter.objects.recount(user)
+        for author in cls.authors[:3]:
+            Post.objects.create(author=author, text=f'Пост {author}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def post(self, data):
+        return self.client.post(
+            reverse('api:follow_authors'),
+            json.dumps(data),
+            content_type='application/json',
+        )
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_bulk_follow(self):
+        """Подписка пачкой обновляет счётчики, ленту и уведомления"""
+        names = ['author00', 'author01', 'reader', 'nobody']
+        response = self.post({'follow': names})
+        self.assertEqual(response.json(), {
+            'followed': ['author00', 'author01'],
+            'unfollowed': [],
+            'not_found': ['nobody'],
+        })
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.reader).values_list(
+                'author__username', flat=True)),
+            {'author00', 'author01'})
+        self.assertEqual(self.counters(self.reader).following_count, 2)
+        self.assertEqual(self.counters(self.authors[0]).followers_count, 1)
+        self.assertEqual(self.counters(self.authors[2]).followers_count, 0)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(Notification.objects.filter(
+            actor=self.reader, kind=Notification.FOLLOW).count(), 2)
+
+        again = self.post({'follow': ['author00', 'author02']}).json()
+        self.assertEqual(again['followed'], ['author02'])
+        self.assertEqual(self.counters(self.reader).following_count, 3)
+        self.assertEqual(self.counters(self.authors[0]).followers_count, 1)
+
+    def test_bulk_follow_query_count_does_not_grow(self):
+        """Число запросов не зависит от числа авторов в пачке"""
+        with CaptureQueriesContext(connection) as few:
+            self.post({'follow': ['author00', 'author01']})
+        with CaptureQueriesContext(connection) as many:
+            self.post({'follow': [
+                author.username for author in self.authors[2:]]})
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(self.counters(self.reader).following_count, 25)
+
+        with CaptureQueriesContext(connection) as few:
+            self.post({'unfollow': ['author00', 'author01']})
+        with CaptureQueriesContext(connection) as many:
+            self.post({'unfollow': [
+                author.username for author in self.authors[2:]]})
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+        self.assertEqual(self.counters(self.authors[9]).followers_count, 0)
+
+    def test_signals_still_count_other_follows(self):
+        """Follow, созданный в обход сервиса, учитывается сигналами"""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_bulk_unfollow(self):
+        self.post({'follow': ['author00', 'author01', 'author02']})
+        response = self.post({
+            'follow': ['author03'],
+            'unfollow': ['author00', 'author01', 'author04'],
+        })
+        self.assertEqual(response.json(), {
+            'followed': ['author03'],
+            'unfollowed': ['author00', 'author01'],
+            'not_found': [],
+        })
+        self.assertEqual(self.counters(self.reader).following_count, 2)
+        self.assertEqual(self.counters(self.authors[0]).followers_count, 0)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.reader).values_list(
+                'post__author__username', flat=True)),
+            ['author02'])
+        self.assertFalse(Notification.objects.filter(
+            actor=self.reader, recipient=self.authors[0]).exists())
+
+    def test_profile_follow_uses_service(self):
+        url = reverse('profile_follow', kwargs={'username': 'author00'})
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        self.client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author00'}))
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_invalid_requests(self):
+        url = reverse('api:follow_authors')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        response = self.client.post(
+            url, 'не json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({'follow': 'author00'}).status_code, 400)
+        self.assertEqual(self.post({
+            'follow': ['author00'], 'unfollow': ['author00'],
+        }).status_code, 400)
+        with self.settings(API_MAX_FOLLOW_BATCH=2):
+            response = self.post({'follow': ['a', 'b', 'c']})
+        self.assertEqual(response.json(), {
+            'detail': 'Не больше 2 имён за запрос'})
+        self.client.logout()
+        self.assertEqual(self.post({'follow': []}).status_code, 403)
+
+    def test_suggested_authors(self):
+        """Сначала авторы, которых читают подписки, затем популярные"""
+        first, second, third, fourth = self.authors[:4]
+        for user, author in [
+            (self.reader, first), (self.reader, second),
+            (first, third), (second, third), (second, fourth),
+            (first, self.reader), (self.authors[9], self.authors[5]),
+        ]:
+            Follow.objects.create(user=user, author=author)
+        response = self.client.get(
+            reverse('api:suggested_authors'), {'limit': 3})
+        self.assertEqual(response.json()['results'], [
+            {'username': 'author02', 'score': 2,
+             'url': reverse('profile', kwargs={'username': 'author02'})},
+            {'username': 'author03', 'score': 1,
+             'url': reverse('profile', kwargs={'username': 'author03'})},
+            {'username': 'author05', 'score': 0,
+             'url': reverse('profile', kwargs={'username': 'author05'})},
+        ])
@@ -0,0 +1,44 @@
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from posts.caching import get_or_refresh
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'early-refresh',
+        }
+    }
+)
+class EarlyRefreshTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def test_fresh_value_is_reused(self):
+        """Свежее значение не пересчитывается"""
+        first = get_or_refresh('key', self.compute, 60)
+        second = get_or_refresh('key', self.compute, 60)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+
+    def test_expiring_value_is_refreshed_early(self):
+        """Значение в конце срока пересчитывается до истечения ключа"""
+        cache.set('key', ('старое', 10.0, time.time() + 0.001), 60)
+        self.assertEqual(get_or_refresh('key', self.compute, 60), 'значение 1')
+        self.assertEqual(get_or_refresh('key', self.compute, 60), 'значение 1')
+
+    def test_value_without_timeout_is_kept(self):
+        """timeout=None кэширует навсегда, без раннего пересчёта"""
+        get_or_refresh('key', self.compute, None)
+        self.assertEqual(get_or_refresh('key', self.compute, None),
+                         'значение 1')
+        self.assertEqual(self.calls, 1)
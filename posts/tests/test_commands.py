@@ -0,0 +1,341 @@
+import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from posts import tasks, transfer
+from posts.management.commands.profile_imports import (
+    importers, parse_importtime, subtree,
+)
+from posts.models import Comment, Follow, Group, Post, User, UserCounter
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class BenchmarkCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_data', '--users=20', '--posts=200', '--groups=3',
+            '--follows=3', '--comments=1', '--batch-size=50',
+            '--with-feeds', stdout=StringIO())
+
+    def test_seed_data_fills_database(self):
+        """seed_data создаёт данные и сводит счётчики"""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        top = User.objects.order_by('pk').first()
+        self.assertEqual(
+            UserCounter.objects.get(user=top).posts_count,
+            top.posts.count())
+
+    def test_bench_views_writes_and_compares_baseline(self):
+        """bench_views пишет JSON и сравнивает его с прошлым прогоном"""
+        path = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        call_command(
+            'bench_views', '--requests=3', f'--output={path}',
+            stdout=StringIO())
+        with open(path) as result:
+            baseline = json.load(result)
+        self.assertEqual(set(baseline['views']), {
+            'index', 'group_posts', 'profile', 'post_view',
+            'follow_index', 'new_post', 'add_comment',
+        })
+        self.assertIn('p99_ms', baseline['views']['index'])
+        out = StringIO()
+        call_command(
+            'bench_views', '--requests=3', f'--compare={path}', stdout=out)
+        self.assertIn('index: p50_ms', out.getvalue())
+
+    def test_bench_concurrency_reports_both_sides(self):
+        """bench_concurrency меряет index и new_post одновременно"""
+        path = os.path.join(tempfile.mkdtemp(), 'concurrency.json')
+        call_command(
+            'bench_concurrency', '--seconds=0.2', '--readers=1',
+            '--writers=1', f'--output={path}', stdout=StringIO())
+        with open(path) as result:
+            report = json.load(result)
+        self.assertEqual(set(report['views']), {'index', 'new_post'})
+        self.assertEqual(report['profile'], 'development')
+        self.assertIn('errors', report['views']['index'])
+
+    def test_profile_templates_writes_collapsed_stacks(self):
+        path = os.path.join(tempfile.mkdtemp(), 'templates.folded')
+        out = StringIO()
+        call_command(
+            'profile_templates', '/', '--requests=2', f'--output={path}',
+            stdout=out)
+        with open(path) as result:
+            stacks = result.read()
+        self.assertIn(
+            'index;index.html;extends base.html;block content', stacks)
+        self.assertIn('Запросов: 2', out.getvalue())
+
+
+class WarmTemplatesTest(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        self.templates_dir = os.path.join(self.base_dir, 'templates')
+        os.makedirs(os.path.join(self.templates_dir, 'includes'))
+        self.write('page.html', "{% include 'includes/part.html' %}")
+        self.write('includes/part.html', 'часть')
+
+    def write(self, name, text):
+        with open(os.path.join(self.templates_dir, name), 'w') as template:
+            template.write(text)
+
+    def override(self, loaders):
+        return override_settings(BASE_DIR=self.base_dir, TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [self.templates_dir],
+            'OPTIONS': {'loaders': loaders},
+        }])
+
+    def test_project_templates_are_warmed(self):
+        """warm_templates загружает каждый шаблон проекта"""
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertRegex(out.getvalue(), r'Загружено шаблонов: [1-9]\d+')
+
+    def test_cached_loader_keeps_warmed_templates(self):
+        with self.override([(
+                'django.template.loaders.cached.Loader',
+                ['django.template.loaders.filesystem.Loader'])]):
+            call_command('warm_templates', stdout=StringIO())
+            loader = engines.all()[0].engine.template_loaders[0]
+            self.assertEqual(
+                set(loader.get_template_cache),
+                {'page.html', 'includes/part.html'})
+
+    def test_broken_templates_are_reported(self):
+        self.write('broken.html', '{% if %}')
+        self.write('includes/missing.html', "{% include 'nope.html' %}")
+        err = StringIO()
+        with self.override(['django.template.loaders.filesystem.Loader']):
+            with self.assertRaisesMessage(
+                    CommandError, 'Шаблонов с ошибками: 2'):
+                call_command(
+                    'warm_templates', stdout=StringIO(), stderr=err)
+        self.assertIn('broken.html: TemplateSyntaxError', err.getvalue())
+        self.assertIn(
+            'includes/missing.html: TemplateDoesNotExist: nope.html',
+            err.getvalue())
+
+
+class StartupImportsTest(SimpleTestCase):
+    IMPORTTIME = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:       100 |        100 | site\n'
+        'import time:       300 |        300 |     PIL\n'
+        'import time:       200 |        500 |   thumbs\n'
+        'import time:        50 |         50 |   conf\n'
+        'import time:      1000 |       1550 | app.wsgi\n'
+    )
+
+    def test_importers_chain(self):
+        rows = subtree(parse_importtime(self.IMPORTTIME), 'app.wsgi')
+        self.assertEqual([row[0] for row in rows], [
+            'PIL', 'thumbs', 'conf', 'app.wsgi'])
+        self.assertEqual(rows[-1], ('app.wsgi', 1000, 1550, 0))
+        self.assertEqual(importers(rows, 0), ['thumbs', 'app.wsgi'])
+
+    def test_worker_startup_within_budget(self):
+        """Импорт yatube.wsgi с прогревом шаблонов укладывается в бюджет
+        и не тянет PIL и движок миниатюр"""
+        # Тест ловит грубые регрессии, а не шум медленного CI или
+        # coverage: бюджет впятеро щедрее STARTUP_IMPORT_BUDGET_MS.
+        # Точный бюджет проверяет отдельный прогон manage.py
+        # profile_imports.
+        out = StringIO()
+        call_command(
+            'profile_imports', '--env=YATUBE_TEMPLATE_CACHE=1', '--top=5',
+            f'--budget={settings.STARTUP_IMPORT_BUDGET_MS * 5}',
+            stdout=out, stderr=StringIO())
+        self.assertIn('yatube.wsgi', out.getvalue())
+        self.assertIn('в пределах бюджета', out.getvalue())
+
+    def test_eager_import_is_reported(self):
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, 'Проблем при старте: 2'):
+            call_command(
+                'profile_imports', '--runs=1', '--budget=0.001',
+                '--forbid=sorl.thumbnail.fields', stdout=StringIO(),
+                stderr=err)
+        self.assertIn(
+            'Импортирован при старте: sorl.thumbnail.fields ←',
+            err.getvalue())
+        self.assertIn('бюджет 0 мс', err.getvalue())
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='transfer', description='Описание')
+        for num in range(3):
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.group if num else None,
+                text=f'Пост {num}, с запятой и "кавычками"\nи переносом',
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(dt.datetime(2020, 1, num + 1)))
+            post.comments.create(author=cls.reader, text=f'Комментарий {num}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def snapshot(self):
+        return {
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+                'comments_count')),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'text', 'created')),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        }
+
+    def call(self, *args):
+        call_command(*args, stdout=StringIO())
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка восстанавливают данные в обоих форматах"""
+        before = self.snapshot()
+        for extension in ('ndjson', 'csv'):
+            with self.subTest(format=extension):
+                paths = {
+                    kind: os.path.join(self.tmp, f'{kind}.{extension}')
+                    for kind in ('posts', 'comments', 'follows')
+                }
+                for kind, path in paths.items():
+                    self.call('export_data', kind, path, '--batch-size=2')
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                Group.objects.all().delete()
+                User.objects.all().delete()
+                for kind, path in paths.items():
+                    self.call('import_data', kind, path, '--batch-size=2')
+                self.assertEqual(self.snapshot(), before)
+                self.assertFalse(
+                    os.path.exists(f'{paths["posts"]}.checkpoint'))
+
+    def test_import_resumes_from_checkpoint(self):
+        """Продолженная загрузка начинает со смещения контрольной точки"""
+        paths = {
+            extension: os.path.join(self.tmp, f'posts.{extension}')
+            for extension in ('ndjson', 'csv')
+        }
+        for path in paths.values():
+            self.call('export_data', 'posts', path)
+        for extension, path in paths.items():
+            with self.subTest(format=extension):
+                with open(path, 'rb') as stream:
+                    records = transfer.read_records(stream, extension)
+                    offset = [next(records) for _ in range(2)][-1][1]
+                Post.objects.all().delete()
+                with open(f'{path}.checkpoint', 'w') as checkpoint:
+                    json.dump({
+                        'position': 2, 'offset': offset,
+                        'loaded': 2, 'skipped': 0,
+                    }, checkpoint)
+                out = StringIO()
+                call_command('import_data', 'posts', path, '--resume',
+                             stdout=out)
+                self.assertTrue(Post.objects.get().text.startswith('Пост 2'))
+                self.assertIn('Загружено записей: 3', out.getvalue())
+
+    def test_taken_ids_are_skipped(self):
+        """Записи с занятыми id не загружаются и не считаются загруженными"""
+        path = os.path.join(self.tmp, 'posts.ndjson')
+        Post.objects.update(image='posts/taken.gif')
+        self.call('export_data', 'posts', path)
+        before = [row[:5] for row in self.snapshot()['posts']]
+        deleted = Post.objects.order_by('pk').first().pk
+        Post.objects.filter(pk=deleted).delete()
+        out = StringIO()
+        with mock.patch.object(tasks.generate_thumbnail, 'delay') as delay:
+            call_command('import_data', 'posts', path, stdout=out)
+        self.assertIn('Загружено записей: 1, пропущено: 2', out.getvalue())
+        self.assertIn('Пропущено 2 с занятыми id', out.getvalue())
+        delay.assert_called_once_with(deleted, 'posts/taken.gif')
+        self.assertEqual(
+            [row[:5] for row in self.snapshot()['posts']], before)
+
+    def test_images_are_copied_both_ways(self):
+        media = os.path.join(self.tmp, 'media')
+        images = os.path.join(self.tmp, 'images')
+        path = os.path.join(self.tmp, 'posts.ndjson')
+        with override_settings(MEDIA_ROOT=media, TASK_BACKEND='immediate'):
+            post = Post.objects.first()
+            post.image = SimpleUploadedFile('small.gif', SMALL_GIF)
+            post.save()
+            self.call('export_data', 'posts', path, f'--images={images}')
+            self.assertTrue(
+                os.path.exists(os.path.join(images, post.image.name)))
+            os.remove(os.path.join(media, post.image.name))
+            Post.objects.all().delete()
+            self.call('import_data', 'posts', path, f'--images={images}')
+            self.assertTrue(
+                os.path.exists(os.path.join(media, post.image.name)))
+            self.assertEqual(
+                Post.objects.get(pk=post.pk).image.name, post.image.name)
+
+    def test_export_resumes_from_checkpoint(self):
+        """Продолженная выгрузка отрезает недописанный хвост"""
+        path = os.path.join(self.tmp, 'posts.ndjson')
+        self.call('export_data', 'posts', path)
+        with open(path, 'rb') as complete:
+            expected = complete.read()
+        first_line = expected.split(b'\n')[0] + b'\n'
+        with open(path, 'wb') as partial:
+            partial.write(first_line + b'{"id": ')
+        with open(f'{path}.checkpoint', 'w') as checkpoint:
+            json.dump({
+                'last_id': Post.objects.order_by('pk').first().pk,
+                'exported': 1,
+                'offset': len(first_line),
+            }, checkpoint)
+        self.call('export_data', 'posts', path, '--resume')
+        with open(path, 'rb') as resumed:
+            self.assertEqual(resumed.read(), expected)
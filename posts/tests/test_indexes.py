@@ -0,0 +1,144 @@
+import re
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import encode_cursor
+
+# Полный проход по таблице без индекса: «SCAN posts_post», а в SQLite
+# до 3.36 — «SCAN TABLE posts_post», но не «... USING INDEX ...» и не
+# обход подзапроса.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!subquery\b)\w+$', re.I)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class FeedIndexTests(TestCase):
+    """Запросы лент читают индексы и не сортируют во временном B-tree."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User.objects.bulk_create(
+            User(username=f'author{num}') for num in range(5))
+        cls.authors = list(User.objects.order_by('pk'))
+        cls.reader = User.objects.create(username='reader')
+        groups = [
+            Group.objects.create(
+                title=f'Группа {num}',
+                slug=f'group{num}',
+                description='Тестовый текст описания'
+            )
+            for num in range(3)
+        ]
+        Post.objects.bulk_create(
+            Post(
+                author=cls.authors[num % len(cls.authors)],
+                group=groups[num % len(groups)] if num % 4 else None,
+                text=f'Пост {num}',
+            )
+            for num in range(300)
+        )
+        cls.post = Post.objects.filter(author=cls.authors[1]).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Текст {num}')
+            for num in range(20)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.authors[1])
+        Follow.objects.create(user=cls.reader, author=cls.authors[2])
+        cls.group = groups[1]
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def query_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append(
+                    (query['sql'], [row[-1] for row in cursor.fetchall()]))
+        return response, plans
+
+    def assert_indexed(self, url, params=None):
+        """Ни один SELECT страницы не сканирует таблицу и не сортирует."""
+        response, plans = self.query_plans(url, params)
+        self.assertTrue(
+            any(plan for _, plan in plans), f'{url}: нет планов запросов')
+        for sql, plan in plans:
+            for step in plan:
+                self.assertNotIn('TEMP B-TREE', step, f'{sql}\n{plan}')
+                self.assertIsNone(FULL_SCAN.match(step), f'{sql}\n{plan}')
+        return response
+
+    def test_full_scan_pattern(self):
+        """FULL_SCAN узнаёт полный проход в записи старых и новых SQLite"""
+        for step in ('SCAN posts_post', 'SCAN TABLE posts_post'):
+            with self.subTest(step=step):
+                self.assertIsNotNone(FULL_SCAN.match(step))
+        for step in (
+            'SCAN posts_post USING INDEX post_pub_date_idx',
+            'SCAN TABLE posts_post USING COVERING INDEX post_pub_date_idx',
+            'SCAN subquery', 'SCAN SUBQUERY 1',
+            'SEARCH posts_post USING INTEGER PRIMARY KEY (rowid=?)',
+        ):
+            with self.subTest(step=step):
+                self.assertIsNone(FULL_SCAN.match(step))
+
+    def test_feeds_use_indexes(self):
+        """index, group_posts, profile, post_view и follow_index"""
+        urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.authors[1].username}),
+            reverse('post', kwargs={
+                'username': self.authors[1].username,
+                'post_id': self.post.id}),
+            reverse('follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_anonymous_validators_use_indexes(self):
+        """Состояние для ETag и Last-Modified анонимов читается по индексу"""
+        self.authorized_client = Client()
+        urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.authors[1].username}),
+            reverse('post', kwargs={
+                'username': self.authors[1].username,
+                'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_cursor_pages_use_indexes(self):
+        """Курсорные страницы тоже читаются по индексу"""
+        urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.authors[1].username}),
+            reverse('follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                page = self.assert_indexed(url).context['page']
+                cursor = encode_cursor(page[len(page) - 1])
+                self.assert_indexed(url, {'after': cursor})
+                self.assert_indexed(url, {'before': cursor})
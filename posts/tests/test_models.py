@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserCounter
 
 
 class PostModelTest(TestCase):
@@ -89,3 +92,64 @@ class GroupModelTest(TestCase):
         group = GroupModelTest.group
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class CounterTest(TestCase):
+    """Денормализованные счётчики постов, подписок и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.user2 = User.objects.create(username='testuser2')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        counters = UserCounter.objects.recount(self.user)
+        counters2 = UserCounter.objects.recount(self.user2)
+        self.assertEqual(counters.posts_count, 0)
+        post = Post.objects.create(author=self.user, text='Тестовый текст')
+        comment = Comment.objects.create(
+            post=post, author=self.user2, text='Комментарий')
+        follow = Follow.objects.create(user=self.user2, author=self.user)
+        counters.refresh_from_db()
+        counters2.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(counters2.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        counters.refresh_from_db()
+        self.assertEqual(counters.posts_count, 0)
+        self.assertEqual(counters.followers_count, 0)
+
+    def test_recount_counters_repairs_drift(self):
+        """recount_counters чинит разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.user, text='Тестовый текст')
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.user2, author=self.user)
+        UserCounter.objects.recount(self.user)
+        UserCounter.objects.filter(user=self.user).update(
+            posts_count=7, followers_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+
+        out = StringIO()
+        call_command('recount_counters', '--dry-run', stdout=out)
+        self.assertIn('неверным числом комментариев: 1', out.getvalue())
+        self.assertIn('неверными счётчиками: 1', out.getvalue())
+        self.assertEqual(
+            UserCounter.objects.get(user=self.user).posts_count, 7)
+
+        call_command('recount_counters', stdout=StringIO())
+        counters = UserCounter.objects.get(user=self.user)
+        post.refresh_from_db()
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.user2).following_count, 1)
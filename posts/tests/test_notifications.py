@@ -0,0 +1,95 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import notifications
+from posts.models import Follow, Notification, Post, User
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class DigestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.other = User.objects.create(
+            username='other', email='other@example.com')
+        cls.silent = User.objects.create(username='silent')
+        cls.reader = User.objects.create(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Про котов')
+
+    def test_events_are_recorded(self):
+        """Подписки и чужие комментарии записываются как события"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post.comments.create(author=self.reader, text='Мяу')
+        self.post.comments.create(author=self.author, text='Сам себе')
+        self.assertEqual(
+            list(Notification.objects.values_list(
+                'recipient__username', 'actor__username', 'kind')),
+            [('author', 'reader', Notification.FOLLOW),
+             ('author', 'reader', Notification.COMMENT)])
+
+    def test_unfollow_and_comment_removal_cancel_events(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = self.post.comments.create(author=self.reader, text='Мяу')
+        follow.delete()
+        comment.delete()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_events_are_coalesced_into_one_digest(self):
+        """Все события получателя уходят одним письмом"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        self.post.comments.create(author=self.reader, text='Мяу')
+        Follow.objects.create(user=self.reader, author=self.silent)
+
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['author@example.com'])
+        self.assertIn('Новые подписчики: reader, other.', message.body)
+        self.assertIn('Мяу', message.body)
+        self.assertIn('3', message.subject)
+        self.assertFalse(
+            Notification.objects.filter(sent_at__isnull=True).exists())
+        self.assertFalse(
+            Notification.objects.filter(recipient=self.silent).exists())
+        self.assertEqual(notifications.send_digests(), 0)
+
+    def test_batches_share_one_connection(self):
+        """Пачки писем идут через одно соединение"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        connection = get_connection()
+        with mock.patch.object(
+                notifications, 'get_connection',
+                return_value=connection) as opened, \
+                mock.patch.object(
+                    connection, 'send_messages',
+                    wraps=connection.send_messages) as sent:
+            call_command('send_digests', '--batch-size=1', stdout=StringIO())
+        opened.assert_called_once_with()
+        self.assertEqual(sent.call_count, 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_delivery_keeps_events(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch(
+                'django.core.mail.backends.locmem.EmailBackend.'
+                'send_messages', side_effect=OSError):
+            with self.assertRaises(OSError):
+                notifications.send_digests()
+        self.assertTrue(
+            Notification.objects.filter(sent_at__isnull=True).exists())
@@ -0,0 +1,153 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+from yatube import replicas
+
+REPLICA_DIR = tempfile.mkdtemp()
+REPLICA = 'replica_test'
+MISSING = 'replica_missing'
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    DATABASE_REPLICAS=[REPLICA],
+)
+class ReplicaRoutingTests(TestCase):
+    """Реплика — снимок пустой тестовой базы, то есть отставшая копия:
+    всё, что создано в тесте, видно только в default."""
+
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(REPLICA_DIR, 'replica.sqlite3')
+        connections['default'].ensure_connection()
+        snapshot = sqlite3.connect(path)
+        connections['default'].connection.backup(snapshot)
+        snapshot.close()
+        super().setUpClass()
+        # Алиасы добавляются после super(): иначе TestCase запретил бы
+        # к ним запросы.
+        settings_dict = connections['default'].settings_dict
+        connections.databases[REPLICA] = {
+            **settings_dict, 'NAME': f'file:{path}?mode=ro'}
+        connections.databases[MISSING] = {
+            **settings_dict,
+            'NAME': f'file:{REPLICA_DIR}/missing.sqlite3?mode=ro',
+        }
+        cls.user = User.objects.create(username='leo')
+        cls.group = Group.objects.create(
+            title='Свежая группа', slug='fresh', description='')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Свежий пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in (REPLICA, MISSING):
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        super().tearDownClass()
+        shutil.rmtree(REPLICA_DIR, ignore_errors=True)
+
+    def setUp(self):
+        replicas.reset_health()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_views_read_from_replica(self):
+        self.assertNotContains(self.client.get(reverse('index')), 'Свежий')
+        response = self.client.get(
+            reverse('group_slug', kwargs={'slug': 'fresh'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_session_and_user_read_from_primary(self):
+        """Отставшая реплика не разлогинивает пользователя"""
+        response = self.authorized_client.get(reverse('index'))
+        self.assertEqual(response.context['user'], self.user)
+        self.assertNotContains(response, 'Свежий')
+
+    def test_other_views_read_from_primary(self):
+        response = self.client.get(reverse('search'), {'q': 'Свежий'})
+        self.assertContains(response, 'Свежий пост')
+
+    def test_write_pins_browser_to_primary(self):
+        response = self.authorized_client.post(
+            reverse('add_comment', kwargs={
+                'username': 'leo', 'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+        cookie = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        response = self.authorized_client.get(
+            reverse('post', kwargs={
+                'username': 'leo', 'post_id': self.post.pk}))
+        self.assertContains(response, 'Комментарий')
+
+    def test_dead_replica_is_skipped(self):
+        with self.settings(DATABASE_REPLICAS=[MISSING, REPLICA]):
+            chosen = {replicas.choose_replica() for _ in range(4)}
+        self.assertEqual(chosen, {REPLICA})
+        self.assertFalse(replicas.is_healthy(MISSING))
+
+    @override_settings(DATABASE_REPLICAS=[MISSING])
+    def test_reads_fall_back_to_primary(self):
+        self.assertContains(self.client.get(reverse('index')), 'Свежий пост')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        response = self.authorized_client.post(
+            reverse('add_comment', kwargs={
+                'username': 'leo', 'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_replicas_are_not_migrated(self):
+        router = replicas.ReplicaRouter()
+        self.assertIs(router.allow_migrate(REPLICA, 'posts'), False)
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+
+class SqlitePragmaTests(TestCase):
+    def connect(self, alias):
+        path = os.path.join(tempfile.mkdtemp(), 'pragmas.sqlite3')
+        wrapper = DatabaseWrapper(
+            {**connections['default'].settings_dict, 'NAME': path}, alias)
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'wal', 'synchronous': 'normal',
+        'busy_timeout': 5000,
+    })
+    def test_production_pragmas_are_applied(self):
+        wrapper = self.connect('pragmas')
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+
+    @override_settings(
+        SQLITE_PRAGMAS={'journal_mode': 'wal'},
+        DATABASE_REPLICAS=['pragmas'],
+    )
+    def test_replicas_keep_journal_mode(self):
+        wrapper = self.connect('pragmas')
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
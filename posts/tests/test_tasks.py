@@ -0,0 +1,165 @@
+import importlib
+import os
+import sys
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import tasks
+from posts.models import FeedEntry, Follow, Post, SearchTerm, Task, User
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    TASK_BACKEND='database',
+    TASK_MAX_ATTEMPTS=3,
+    TASK_RETRY_DELAY=10,
+)
+class DatabaseQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def process(self):
+        call_command('process_tasks', '--once', stdout=StringIO(),
+                     stderr=StringIO())
+
+    def test_views_only_enqueue_side_effects(self):
+        """Запрос ставит задачи, а работу делает воркер"""
+        self.reader_client.get(reverse(
+            'profile_follow', kwargs={'username': 'author'}))
+        self.author_client.post(reverse('new_post'), {'text': 'Кот'})
+        self.assertEqual(
+            set(Task.objects.values_list('name', flat=True)), {
+                tasks.backfill_many.task_name,
+                tasks.index_post.task_name,
+                tasks.fan_out.task_name,
+            })
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertFalse(SearchTerm.objects.exists())
+
+        self.process()
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertTrue(SearchTerm.objects.filter(term='кот').exists())
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Упавшая задача откладывается всё дальше и в итоге проваливается"""
+        tasks.fan_out.delay(1)
+        job = Task.objects.get()
+        delays = []
+        with mock.patch.dict(tasks.registry, {
+                job.name: mock.Mock(side_effect=RuntimeError('сбой'))}), \
+                self.assertLogs('posts.tasks', 'ERROR'):
+            for _ in range(3):
+                Task.objects.update(run_at=timezone.now())
+                started = timezone.now()
+                self.process()
+                job.refresh_from_db()
+                delays.append(round((job.run_at - started).total_seconds()))
+        self.assertEqual(job.status, Task.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(job.last_error, 'RuntimeError: сбой')
+        self.assertEqual(delays[:2], [10, 20])
+
+    def test_abandoned_task_is_claimed_again(self):
+        """Задачу умершего воркера забирают после TASK_LOCK_TIMEOUT"""
+        tasks.fan_out.delay(1)
+        first = tasks.claim()
+        self.assertIsNotNone(first)
+        self.assertIsNone(tasks.claim())
+        Task.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        second = tasks.claim()
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.attempts, 2)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    TASK_BACKEND='immediate',
+)
+class ImmediateQueueTests(TestCase):
+    def test_tasks_run_inline_and_errors_are_logged(self):
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(author=author, text='Кот')
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(FeedEntry.objects.filter(user=reader).exists())
+        with mock.patch.dict(tasks.registry, {
+                tasks.fan_out.task_name: mock.Mock(side_effect=KeyError)}):
+            with self.assertLogs('posts.tasks', 'ERROR'):
+                tasks.fan_out.delay(1)
+
+    def test_failed_task_does_not_break_transaction(self):
+        """Ошибка базы в задаче откатывается до её точки сохранения"""
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=author)
+
+        def duplicate_follow(*args):
+            Follow.objects.create(user=reader, author=author)
+
+        with transaction.atomic():
+            with mock.patch.dict(tasks.registry, {
+                    tasks.fan_out.task_name: duplicate_follow}):
+                with self.assertLogs('posts.tasks', 'ERROR'):
+                    tasks.fan_out.delay(1)
+            self.assertEqual(Follow.objects.count(), 1)
+
+
+class ThreadQueueTests(TestCase):
+    def test_default_backend_is_thread(self):
+        """По умолчанию thread; тесты переключены на immediate"""
+        self.assertEqual(settings.TASK_BACKEND, 'immediate')
+        with mock.patch.dict('os.environ'), mock.patch.dict(sys.modules):
+            os.environ.pop('YATUBE_TASK_BACKEND', None)
+            sys.modules.pop('yatube.settings', None)
+            self.assertEqual(
+                importlib.import_module('yatube.settings').TASK_BACKEND,
+                'thread')
+
+    def test_failed_task_moves_to_database(self):
+        """Упавшая в пуле задача сохраняется в базе для process_tasks"""
+        author = User.objects.create(username='author')
+        post = Post.objects.create(author=author, text='Кот')
+        SearchTerm.objects.all().delete()
+        failing = mock.Mock(side_effect=KeyError)
+        with mock.patch.dict(tasks.registry, {
+                tasks.index_post.task_name: failing}), \
+                mock.patch.object(tasks.connection, 'close'):
+            with self.assertLogs('posts.tasks', 'ERROR'):
+                tasks.run_in_thread(tasks.index_post.task_name, (post.pk,))
+        job = Task.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.status, Task.PENDING)
+        self.assertIn('KeyError', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+
+        Task.objects.update(run_at=timezone.now())
+        call_command('process_tasks', '--once', stdout=StringIO())
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(SearchTerm.objects.filter(post=post).exists())
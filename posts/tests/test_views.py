@@ -1,13 +1,24 @@
+import csv
+import json
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode
 
-from posts.models import Group, Post, User, Follow
+from posts import pages, thumbnails
+from posts.models import FeedEntry, Follow, Group, Post, User, UserCounter
+from posts.paginators import elided_page_range
+from yatube import metrics, template_profile
 
 MEDIA_ROOT = tempfile.mkdtemp()
 
@@ -304,3 +315,972 @@ class CacheTests(TestCase):
         )
         response = self.authorized_client.get(reverse('index'))
         self.assertEqual(len(response.context['page']), 1)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        for num in range(25):
+            Post.objects.create(author=cls.user, text=f'Пост {num}')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_pages_cover_feed(self):
+        """Курсорные страницы проходят всю ленту без пропусков и повторов"""
+        response = self.guest_client.get(reverse('index'))
+        seen = [post.id for post in response.context['page']]
+        cursor = response.context['page'].next_cursor
+        while cursor:
+            response = self.guest_client.get(
+                reverse('index'), {'after': cursor})
+            page = response.context['page']
+            seen += [post.id for post in page]
+            cursor = page.next_cursor
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_previous_page(self):
+        """Ссылка ?before= возвращает предыдущую страницу"""
+        first = self.guest_client.get(reverse('index')).context['page']
+        second = self.guest_client.get(
+            reverse('index'), {'after': first.next_cursor}
+        ).context['page']
+        back = self.guest_client.get(
+            reverse('index'), {'before': second.previous_cursor}
+        ).context['page']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу"""
+        response = self.guest_client.get(
+            reverse('index'), {'after': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), settings.PER_PAGE)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_out_of_range_pk_is_broken_cursor(self):
+        """id, который не влезает в базу, — битый курсор, а не 500"""
+        for pk in ('99999999999999999999999', '0', '-5'):
+            cursor = urlsafe_base64_encode(
+                f'2020-01-01T00:00:00|{pk}'.encode())
+            for param in ('after', 'before'):
+                with self.subTest(pk=pk, param=param):
+                    response = self.guest_client.get(
+                        reverse('index'), {param: cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(
+                        response.context['page'].has_previous())
+
+    def test_page_number_still_works(self):
+        """Старые ссылки ?page=N продолжают работать"""
+        response = self.guest_client.get(reverse('index'), {'page': 3})
+        self.assertEqual(len(response.context['page']), 5)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ApproximateCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        for num in range(25):
+            Post.objects.create(author=cls.user, text=f'Пост {num}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def stale_count(self, value):
+        cache.set('post_count:all', (value, 0, time.time() + 60), 60)
+
+    def test_count_is_cached(self):
+        """Номера страниц не требуют COUNT(*) на каждый запрос"""
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['paginator'].num_pages, 3)
+        self.assertFalse(
+            [q for q in captured.captured_queries if '__count' in q['sql']])
+
+    def test_low_count_is_recounted(self):
+        self.stale_count(3)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['paginator'].count, 25)
+        self.assertTrue(response.context['page'].has_next())
+
+    def test_high_count_is_corrected_by_short_page(self):
+        self.stale_count(100)
+        response = self.client.get(reverse('index'), {'page': 3})
+        self.assertEqual(response.context['paginator'].count, 25)
+        self.assertFalse(response.context['page'].has_next())
+
+    def test_page_past_the_end_falls_back_to_last(self):
+        self.stale_count(100)
+        response = self.client.get(reverse('index'), {'page': 8})
+        page = response.context['page']
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+
+    @override_settings(PER_PAGE=1)
+    def test_page_links_are_elided(self):
+        """Вместо 25 ссылок — края и окно вокруг текущей страницы"""
+        response = self.client.get(reverse('index'), {'page': 12})
+        self.assertEqual(
+            response.context['page'].page_links,
+            [1, None, 10, 11, 12, 13, 14, None, 25])
+        self.assertContains(response, '&hellip;', count=2)
+        self.assertNotContains(response, '?page=5"')
+
+    def test_elided_page_range_edges(self):
+        self.assertEqual(list(elided_page_range(1, 3)), [1, 2, 3])
+        self.assertEqual(
+            list(elided_page_range(1, 10)), [1, 2, 3, None, 10])
+        self.assertEqual(list(elided_page_range(5, 7)), list(range(1, 8)))
+        self.assertEqual(
+            list(elided_page_range(250_000, 500_000)),
+            [1, None, 249_998, 249_999, 250_000, 250_001, 250_002, None,
+             500_000])
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class QueryBudgetTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='budget',
+            description='Тестовый текст описания'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        UserCounter.objects.recount(cls.user)
+        cls.post = cls.create_posts(1)
+
+    @classmethod
+    def create_posts(cls, count):
+        for _ in range(count):
+            post = Post.objects.create(
+                group=cls.group,
+                author=cls.user,
+                text='Тестовый текст'
+            )
+            post.comments.create(author=cls.reader, text='Комментарий')
+        return post
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def assert_query_budget(self, url, budget):
+        """Страница укладывается в budget запросов.
+
+        Возвращает фактическое число запросов, чтобы его можно было
+        сравнить с той же страницей на другом объёме данных.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries)
+        )
+        return len(queries)
+
+    def test_feed_query_budget(self):
+        """Ленты укладываются в бюджет запросов при любом PER_PAGE"""
+        budgets = {
+            reverse('index'): 4,
+            reverse('group_slug', kwargs={'slug': self.group.slug}): 5,
+            reverse('profile', kwargs={'username': self.user.username}): 6,
+            reverse('post', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}): 4,
+            reverse('follow_index'): 5,
+        }
+        used = {
+            url: self.assert_query_budget(url, budget)
+            for url, budget in budgets.items()
+        }
+        self.create_posts(settings.PER_PAGE * 2)
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.assert_query_budget(url, budget), used[url])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    FOLLOW_FEED_MATERIALIZED=True,
+    FEED_FANOUT_LIMIT=2,
+)
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.star = User.objects.create(username='star')
+        cls.reader = User.objects.create(username='reader')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed_ids(self):
+        response = self.authorized_client.get(reverse('follow_index'))
+        return [post.id for post in response.context['page']]
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет посты автора в ленту, отписка убирает"""
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.feed_ids(), [new_post.id, self.old_post.id])
+        self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_ids(), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте"""
+        Follow.objects.create(user=self.author, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        star_post = Post.objects.create(author=self.star, text='Звезда')
+        self.assertFalse(FeedEntry.objects.filter(post=star_post).exists())
+        self.assertEqual(self.feed_ids(), [star_post.id, self.old_post.id])
+
+    def test_author_below_limit_keeps_earlier_posts(self):
+        """Посты времён популярности остаются в ленте после отписок"""
+        Follow.objects.create(user=self.author, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Звезда')
+        self.assertFalse(FeedEntry.objects.filter(post=star_post).exists())
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'star'}))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=star_post).exists())
+        self.assertEqual(self.feed_ids(), [star_post.id])
+
+        # Отписка без сервиса, через сигнал post_delete.
+        Follow.objects.create(user=self.author, author=self.star)
+        later_post = Post.objects.create(author=self.star, text='Позже')
+        Follow.objects.filter(user=self.author, author=self.star).delete()
+        self.assertEqual(self.feed_ids(), [later_post.id, star_post.id])
+
+    def test_author_without_counters_is_read_on_demand(self):
+        """Счётчики без строки пересчитываются, а не считаются нулём"""
+        Follow.objects.create(user=self.author, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Звезда')
+        UserCounter.objects.filter(user=self.star).delete()
+        self.assertEqual(self.feed_ids(), [star_post.id])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'post-cards',
+        }
+    }
+)
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.user2 = User.objects.create(username='testuser2')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cards',
+            description='Тестовый текст описания'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.authorized_client2 = Client()
+        self.authorized_client2.force_login(self.user2)
+
+    def test_unchanged_card_is_not_rendered_again(self):
+        """Неизменённая карточка берётся из кэша на всех лентах"""
+        self.guest_client.get(reverse('index'))
+        urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTemplateNotUsed(
+                    response, 'includes/post_item.html')
+                self.assertContains(response, 'Тестовый текст')
+
+    def test_edit_is_visible_immediately(self):
+        """Правка поста, комментарий и смена группы видны сразу"""
+        self.guest_client.get(reverse('index'))
+        self.authorized_client.post(
+            reverse('post_edit', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}),
+            {'text': 'Новый текст', 'group': self.group.id}
+        )
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Новый текст')
+        self.authorized_client2.post(
+            reverse('add_comment', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}),
+            {'text': 'Комментарий'}
+        )
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Комментариев: 1')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(
+            self.guest_client.get(reverse('index')), '#Новое название')
+
+    def test_edit_button_is_shown_to_author_only(self):
+        """Кнопку «Редактировать» видит только автор"""
+        edit_url = reverse('post_edit', kwargs={
+            'username': self.user.username,
+            'post_id': self.post.id})
+        self.assertNotContains(
+            self.authorized_client2.get(reverse('index')), edit_url)
+        self.assertContains(
+            self.authorized_client.get(reverse('index')), edit_url)
+        self.assertNotContains(
+            self.guest_client.get(reverse('index')), edit_url)
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    TASK_BACKEND='database',
+)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_card_shows_placeholder_until_thumbnail_is_ready(self):
+        """До нарезки миниатюры карточка показывает заглушку"""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        self.authorized_client.post(reverse('new_post'), {
+            'text': 'Тестовый текст',
+            'image': SimpleUploadedFile(
+                'small.gif', small_gif, content_type='image/gif'),
+        })
+        post = Post.objects.get()
+        self.assertFalse(post.thumbnail_ready)
+        self.assertContains(
+            self.authorized_client.get(reverse('index')),
+            'Картинка обрабатывается')
+
+        thumbnail = mock.Mock(url='/media/cache/small.jpg')
+        with mock.patch.object(
+                thumbnails, 'card_thumbnail', return_value=thumbnail):
+            thumbnails.generate(post.pk, post.image.name)
+            response = self.authorized_client.get(reverse('index'))
+        ready = Post.objects.get()
+        self.assertTrue(ready.thumbnail_ready)
+        self.assertGreater(ready.card_version, post.card_version)
+        self.assertContains(response, '/media/cache/small.jpg')
+        self.assertNotContains(response, 'Картинка обрабатывается')
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.group = Group.objects.create(
+            title='Садоводы',
+            slug='garden',
+            description='Тестовый текст описания'
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты и кошки. Кот спит с котами.')
+        cls.cat = Post.objects.create(
+            author=cls.user, text='Про одного кота')
+        cls.dog = Post.objects.create(
+            author=cls.user, text='Собака', group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query, **params):
+        response = self.guest_client.get(
+            reverse('search'), {'q': query, **params})
+        return [post.id for post in response.context['page']]
+
+    def test_russian_word_forms_are_found_by_rank(self):
+        """Поиск находит формы слова, чаще упомянутое выше"""
+        self.assertEqual(self.found('котов'), [self.cats.id, self.cat.id])
+        self.assertEqual(self.found('кот спит'), [self.cats.id])
+        self.assertEqual(self.found('жираф'), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_group_title_is_searchable(self):
+        """Поиск идёт и по названию группы поста"""
+        self.assertEqual(self.found('садоводам'), [self.dog.id])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Собаководы'
+        group.save()
+        self.assertEqual(self.found('садоводам'), [])
+
+    def test_deleted_group_leaves_index(self):
+        """Посты удалённой группы не находятся по её названию"""
+        Group.objects.filter(pk=self.group.pk).delete()
+        self.assertEqual(self.found('садоводам'), [])
+        self.assertEqual(self.found('собака'), [self.dog.id])
+
+    def test_idf_uses_post_count(self):
+        """N для idf — число постов, а не Max('pk')"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.found('собака'), [self.dog.id])
+        self.assertFalse(any(
+            'MAX(' in query['sql'].upper() for query in queries))
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        cat = Post.objects.get(pk=self.cat.pk)
+        cat.text = 'Про одного жирафа'
+        cat.save()
+        self.assertEqual(self.found('кот'), [self.cats.id])
+        self.assertEqual(self.found('жираф'), [self.cat.id])
+        cat.delete()
+        self.assertEqual(self.found('жираф'), [])
+
+    def test_search_cursor_pages(self):
+        """Результаты поиска листаются курсором"""
+        for num in range(settings.PER_PAGE + 2):
+            Post.objects.create(author=self.user, text=f'Кот номер {num}')
+        response = self.guest_client.get(reverse('search'), {'q': 'кот'})
+        page = response.context['page']
+        seen = [post.id for post in page]
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82')
+        seen += self.found('кот', after=page.next_cursor)
+        self.assertEqual(len(seen), settings.PER_PAGE + 4)
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_cursor_of_other_feed_returns_first_page(self):
+        """Курсор поиска на ленте по дате и наоборот — битый курсор"""
+        score_cursor = urlsafe_base64_encode(
+            f'5|{self.cat.pk}'.encode())
+        urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('api:posts'),
+            reverse('api:comments', kwargs={'post_id': self.cat.pk}),
+        ]
+        for url in urls:
+            for param in ('after', 'before'):
+                with self.subTest(url=url, param=param):
+                    response = self.guest_client.get(
+                        url, {param: score_cursor})
+                    self.assertEqual(response.status_code, 200)
+        date_cursor = urlsafe_base64_encode(
+            f'{self.cat.pub_date.isoformat()}|{self.cat.pk}'.encode())
+        for param in ('after', 'before'):
+            with self.subTest(url='search', param=param):
+                self.assertEqual(
+                    self.found('кот', **{param: date_cursor}),
+                    [self.cats.id, self.cat.id])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='Тестовый текст')
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def test_metrics_are_exposed_to_staff_only(self):
+        """Метрики по имени URL видны только администраторам"""
+        self.authorized_client.get(reverse('index'))
+        response = self.authorized_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        response = self.admin_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"} 1', body)
+        self.assertIn('yatube_db_queries_count{view="index"} 1', body)
+        self.assertRegex(
+            body, r'yatube_request_duration_seconds_recent\{view="index",'
+                  r'quantile="0\.95"\} \d')
+        self.assertRegex(
+            body, r'yatube_template_duration_seconds_sum\{view="index"\} '
+                  r'0\.0*[1-9]')
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_is_logged_with_sql(self):
+        """Медленный запрос пишется в лог вместе с SQL"""
+        with self.assertLogs('yatube.slow_requests') as logs:
+            self.authorized_client.get(reverse('index'))
+        self.assertIn('posts_post', logs.output[0])
+
+    def test_rolling_window_forgets_old_observations(self):
+        """Наблюдения старше окна не попадают в гистограмму"""
+        histogram = metrics.RollingHistogram((1, 10), 3, 60)
+        histogram.observe(5, now=0)
+        histogram.observe(50, now=150)
+        self.assertEqual(histogram.snapshot(now=150), ([0, 1, 2], 55.0, 2))
+        self.assertEqual(histogram.snapshot(now=200), ([0, 0, 1], 50.0, 1))
+
+    def test_counters_are_cumulative(self):
+        """_count и _bucket не убывают, окно влияет только на квантили"""
+        series = metrics.Series((1, 10))
+        series.observe(0.5)
+        series.observe(5)
+        series.window.slots = [
+            series.window._empty(None) for _ in series.window.slots]
+        self.assertEqual(series.total.snapshot(), ([1, 2, 2], 5.5, 2))
+        self.assertIsNone(series.window.quantile(0.5))
+
+    def test_recent_quantiles(self):
+        histogram = metrics.RollingHistogram((1, 10), 3, 60)
+        for value in (0.5, 5, 5, 5):
+            histogram.observe(value, now=0)
+        self.assertEqual(histogram.quantile(0.25, now=0), 1)
+        self.assertEqual(histogram.quantile(0.625, now=0), 5.5)
+        histogram.observe(50, now=0)
+        self.assertEqual(histogram.quantile(0.99, now=0), 10)
+
+
+@override_settings(
+    TEMPLATE_PROFILING=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+)
+class TemplateProfileTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='Тестовый текст')
+
+    def setUp(self):
+        template_profile.profile.clear()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def test_collapsed_stacks_cover_includes_and_blocks(self):
+        """Стеки идут от представления через block к include"""
+        self.client.get(reverse('index'))
+        response = self.admin_client.get(reverse('template_profile'))
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        stacks = {line.rsplit(' ', 1)[0] for line in lines}
+        self.assertIn(
+            'index;index.html;extends base.html;block content;'
+            'includes/post_item.html', stacks)
+        self.assertIn('index;includes/nav.html', stacks)
+        for line in lines:
+            self.assertRegex(line, r' [1-9]\d*$')
+
+    def test_summary_aggregates_requests(self):
+        for _ in range(3):
+            self.client.get(reverse('index'))
+        response = self.admin_client.get(
+            reverse('template_profile'), {'format': 'summary'})
+        body = response.content.decode()
+        self.assertIn('Запросов: 3\n', body)
+        self.assertRegex(body, r' 3  includes/post_item\.html')
+
+    def test_profile_is_shown_to_staff_only(self):
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(reverse('template_profile'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(TEMPLATE_PROFILING=False)
+    def test_disabled_by_default(self):
+        Client().get(reverse('index'))
+        self.assertEqual(template_profile.profile.requests, 0)
+
+
+@override_settings(
+    PAGE_CACHE_TIMEOUT=0,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'conditional',
+        }
+    },
+)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='conditional',
+            description='Тестовый текст описания'
+        )
+        cls.post = Post.objects.create(
+            group=cls.group, author=cls.user, text='Тестовый текст')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = [
+            reverse('index'),
+            reverse('group_slug', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('post', kwargs={
+                'username': self.user.username, 'post_id': self.post.id}),
+        ]
+
+    def test_anonymous_pages_are_revalidated(self):
+        """Аноним получает 304 по ETag и по Last-Modified"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage=30', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                by_etag = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(by_etag.status_code, 304)
+                self.assertEqual(by_etag['ETag'], response['ETag'])
+                by_date = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(by_date.status_code, 304)
+
+    def test_not_modified_skips_rendering(self):
+        """Ответ 304 стоит одного запроса и не рендерит шаблон"""
+        url = reverse('index')
+        etag = self.guest_client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.templates, [])
+
+    def test_changes_invalidate_etag(self):
+        """Правка, комментарий и новый пост меняют ETag страниц"""
+        post_url = self.urls[3]
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                etags[url] = response['ETag']
+        post.comments.create(author=self.user, text='Комментарий')
+        response = self.guest_client.get(
+            post_url, HTTP_IF_NONE_MATCH=etags[post_url])
+        self.assertEqual(response.status_code, 200)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.guest_client.get(
+            self.urls[0], HTTP_IF_NONE_MATCH=etags[self.urls[0]])
+        self.assertEqual(response.status_code, 200)
+
+    def test_edits_and_deletes_move_last_modified(self):
+        """Клиент с одним If-Modified-Since не получит устаревший 304"""
+        dates = {url: self.guest_client.get(url)['Last-Modified']
+                 for url in self.urls}
+        later = pages.now_ms() + 5000
+        with mock.patch.object(pages, 'now_ms', return_value=later):
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Исправленный текст'
+            post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=dates[url])
+                self.assertEqual(response.status_code, 200)
+        extra = Post.objects.create(author=self.user, text='Лишний пост')
+        index = self.guest_client.get(self.urls[0])['Last-Modified']
+        with mock.patch.object(pages, 'now_ms', return_value=later + 5000):
+            extra.delete()
+        response = self.guest_client.get(
+            self.urls[0], HTTP_IF_MODIFIED_SINCE=index)
+        self.assertEqual(response.status_code, 200)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы залогиненных не кэшируются на общих прокси"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotIn('ETag', response)
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_missing_objects_still_404(self):
+        urls = [
+            reverse('group_slug', kwargs={'slug': 'missing'}),
+            reverse('profile', kwargs={'username': 'missing'}),
+        ]
+        for url in urls:
+            for client in (self.guest_client, self.authorized_client):
+                with self.subTest(url=url):
+                    response = client.get(url)
+                    self.assertEqual(response.status_code, 404)
+                    self.assertNotIn('ETag', response)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.user2 = User.objects.create(username='testuser2')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='pages',
+            description='Тестовый текст описания'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый текст')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.authorized_client2 = Client()
+        self.authorized_client2.force_login(self.user2)
+        self.edit_url = reverse('post_edit', kwargs={
+            'username': self.user.username, 'post_id': self.post.id})
+
+    def test_page_body_is_served_from_cache(self):
+        """Повторный запрос ленты не рендерит страницу"""
+        for url in (reverse('index'),
+                    reverse('group_slug', kwargs={'slug': 'pages'})):
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertTemplateUsed(first, 'base.html')
+                second = self.guest_client.get(url)
+                self.assertTemplateNotUsed(second, 'base.html')
+                self.assertEqual(second.content, first.content)
+
+    def test_holes_are_rendered_per_user(self):
+        """Залогиненный получает закэшированное тело со своими дырами"""
+        self.guest_client.get(reverse('index'))
+        response = self.authorized_client.get(reverse('index'))
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'Пользователь: testuser.')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertContains(response, self.edit_url)
+        self.assertNotContains(response, '<!--hole:')
+        response = self.authorized_client2.get(reverse('index'))
+        self.assertContains(response, 'Пользователь: testuser2.')
+        self.assertNotContains(response, self.edit_url)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Избранные авторы')
+
+    def test_query_string_is_part_of_the_key(self):
+        self.guest_client.get(reverse('index'))
+        response = self.guest_client.get(reverse('index'), {'page': 2})
+        self.assertTemplateUsed(response, 'base.html')
+
+    def test_unused_query_params_share_the_key(self):
+        """Посторонние параметры не плодят записи и не обходят кэш"""
+        self.guest_client.get(reverse('index'))
+        response = self.guest_client.get(
+            reverse('index'), {'utm_source': 'mail', 'x': 1})
+        self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_changes_purge_only_their_sections(self):
+        """Пост без группы не сбрасывает страницы групп"""
+        group_url = reverse('group_slug', kwargs={'slug': 'pages'})
+        self.guest_client.get(group_url)
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(author=self.user2, text='Свежий пост')
+        self.assertTemplateNotUsed(
+            self.guest_client.get(group_url), 'base.html')
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Свежий пост')
+
+    def test_moved_post_purges_old_group(self):
+        other = Group.objects.create(title='Другая', slug='other')
+        group_url = reverse('group_slug', kwargs={'slug': 'pages'})
+        self.assertContains(self.guest_client.get(group_url), 'Тестовый текст')
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        self.assertNotContains(
+            self.guest_client.get(group_url), 'Тестовый текст')
+
+    def test_changes_purge_pages(self):
+        """Новый пост, комментарий и правка группы сбрасывают кэш"""
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(author=self.user2, text='Свежий пост')
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Свежий пост')
+        self.post.comments.create(author=self.user2, text='Комментарий')
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Комментариев: 1')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(
+            self.guest_client.get(reverse('index')), '#Новое название')
+
+    def test_post_text_cannot_punch_holes(self):
+        """Метка дыры в тексте поста экранируется и не заполняется"""
+        marker = pages.hole_marker('includes/nav.html', {})
+        Post.objects.create(author=self.user2, text=marker)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Регистрация', count=1)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    }
+)
+class ProfileExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='testuser')
+        cls.user2 = User.objects.create(username='testuser2')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {num}')
+            for num in range(3)
+        ]
+        Post.objects.create(author=cls.user2, text='Чужой пост')
+        cls.posts[0].comments.create(author=cls.user, text='Свой')
+        cls.posts[0].comments.create(author=cls.user2, text='Чужой')
+        cls.url = reverse('profile_export', kwargs={'username': 'testuser'})
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_ndjson_export_streams_posts_and_comments(self):
+        """Автор получает все свои посты и комментарии потоком NDJSON"""
+        response = self.authorized_client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertIn('testuser.ndjson', response['Content-Disposition'])
+        records = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'Пост 0'), ('post', 'Пост 1'), ('post', 'Пост 2'),
+             ('comment', 'Свой')])
+
+    def test_csv_export(self):
+        response = self.authorized_client.get(self.url, {'format': 'csv'})
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(
+            b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3]['post'], str(self.posts[0].pk))
+
+    def test_export_is_only_for_author(self):
+        guest = Client().get(self.url)
+        self.assertEqual(guest.status_code, 302)
+        self.assertIn(reverse('login'), guest.url)
+        other = Client()
+        other.force_login(self.user2)
+        self.assertRedirects(
+            other.get(self.url),
+            reverse('profile', kwargs={'username': 'testuser'}))
+        response = self.authorized_client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
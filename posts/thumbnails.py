@@ -0,0 +1,32 @@
+"""Фоновая нарезка миниатюр для карточек постов.
+
+Миниатюру режет задача generate_thumbnail (см. posts.tasks) сразу
+после загрузки картинки, а карточка до этого показывает заглушку
+вместо того, чтобы резать изображение внутри запроса первого читателя.
+"""
+from django.db.models import F
+
+from . import pages
+from .models import Post
+
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def card_thumbnail(image):
+    from sorl.thumbnail import get_thumbnail
+    return get_thumbnail(image, CARD_GEOMETRY, **CARD_OPTIONS)
+
+
+def generate(post_id, image_name):
+    """Режет миниатюру и помечает пост, если картинка не сменилась."""
+    post = Post.objects.filter(pk=post_id, image=image_name).first()
+    if post is None:
+        return
+    card_thumbnail(post.image)
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnail_ready=True,
+        card_version=F('card_version') + 1,
+    )
+    if updated:
+        pages.purge(*pages.post_sections(post))
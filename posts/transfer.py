@@ -0,0 +1,198 @@
+"""Перенос постов, комментариев и подписок в NDJSON и CSV.
+
+Команды export_data и import_data читают и пишут записи пачками, так
+что память не зависит от размера выгрузки. После каждой пачки они
+сохраняют контрольную точку рядом с файлом — смещение в байтах, — и
+прерванный перенос продолжается с --resume прямо с этого места, без
+перечитывания начала файла. Посты и комментарии переносятся со
+своими id: комментарии ссылаются на посты по id. Записи, чьи id уже
+заняты, и подписки, которые уже есть, не загружаются и считаются
+пропущенными, поэтому повторный импорт той же пачки ничего не
+дублирует. Подписки встают под новыми id.
+"""
+import csv
+import json
+import os
+
+from .models import Comment, Follow, Post
+
+KINDS = {
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+FIELDS = {
+    'posts': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('id', 'user', 'author'),
+}
+# Колонки values_list, из которых собираются поля FIELDS.
+COLUMNS = {
+    'posts': (
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image',
+    ),
+    'comments': ('pk', 'post_id', 'author__username', 'text', 'created'),
+    'follows': ('pk', 'user__username', 'author__username'),
+}
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+# Колонки выгрузки пользователя: в ней посты и комментарии вперемешку.
+USER_FIELDS = (
+    'type', 'id', 'post', 'author', 'group', 'text', 'pub_date', 'created',
+    'image',
+)
+USER_CHUNK_SIZE = 2000
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def to_record(kind, row):
+    record = dict(zip(FIELDS[kind], row))
+    for field, value in record.items():
+        if hasattr(value, 'isoformat'):
+            record[field] = value.isoformat()
+        elif field == 'image':
+            record[field] = value or None
+    return record
+
+
+class NdjsonWriter:
+    def __init__(self, stream, fields):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class CsvWriter:
+    def __init__(self, stream, fields):
+        self.writer = csv.DictWriter(stream, fieldnames=fields)
+        if not stream.tell():
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter}
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        yield writer.writerow([record.get(field) for field in fields])
+
+
+LINES = {
+    'ndjson': ndjson_lines,
+    'csv': lambda records: csv_lines(records, USER_FIELDS),
+}
+
+
+def user_records(user, chunk_size=USER_CHUNK_SIZE):
+    """Посты и комментарии пользователя; queryset читается кусками."""
+    for kind in ('posts', 'comments'):
+        rows = KINDS[kind].objects.filter(author=user).order_by(
+            'pk').values_list(*COLUMNS[kind]).iterator(chunk_size=chunk_size)
+        for row in rows:
+            yield {'type': kind[:-1], **to_record(kind, row)}
+
+
+def lines(stream):
+    """Строки бинарного файла, декодированные из UTF-8."""
+    for line in iter(stream.readline, b''):
+        yield line.decode('utf-8')
+
+
+def read_records(stream, fmt, offset=0):
+    """Пары (запись, смещение после неё) бинарного файла с offset.
+
+    Пустые значения CSV становятся None; заголовок CSV читается
+    из начала файла, откуда бы ни шло чтение.
+    """
+    if fmt == 'csv':
+        stream.seek(0)
+        fields = next(csv.reader(lines(stream)), None)
+        if fields is None:
+            return
+        stream.seek(max(offset, stream.tell()))
+        for row in csv.DictReader(lines(stream), fieldnames=fields):
+            yield {
+                field: value if value != '' else None
+                for field, value in row.items()
+            }, stream.tell()
+        return
+    stream.seek(offset)
+    for line in lines(stream):
+        if line.strip():
+            yield json.loads(line), stream.tell()
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def load_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as checkpoint:
+            return json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    """Пишет контрольную точку атомарно: через временный файл."""
+    target = checkpoint_path(path)
+    with open(f'{target}.tmp', 'w') as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(f'{target}.tmp', target)
+
+
+def drop_checkpoint(path):
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def create_with_dates(model, objs):
+    """bulk_create, который оставляет даты из файла в полях auto_now_add.
+
+    bulk_create ставит в такие поля текущее время, поэтому даты
+    возвращаются в объекты и дописываются bulk_update той же пачкой.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    dates = [
+        [getattr(obj, field.attname) for field in fields] for obj in objs
+    ]
+    model.objects.bulk_create(objs)
+    if not fields or not objs:
+        return
+    for obj, values in zip(objs, dates):
+        for field, value in zip(fields, values):
+            setattr(obj, field.attname, value)
+    model.objects.bulk_update(objs, [field.name for field in fields])
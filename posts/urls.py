@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_slug'),
     path('new/', views.new_post, name='new_post'),
+    path('search/', views.search, name='search'),
     path(
         '<str:username>/<int:post_id>/comment',
         views.add_comment,
@@ -22,6 +23,11 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        '<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path(
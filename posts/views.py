@@ -1,18 +1,29 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from . import follows, pages
+from .conditional import (
+    conditional_page, group_state, index_state, post_state, profile_state,
+)
+from .feeds import follow_feed
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Group, Post, User, Follow, UserCounter
+from .pages import cache_page_body
+from .paginators import cached_count, paginate
+from .search import SEARCH_KEYS, search_posts
+from .transfer import CONTENT_TYPES, LINES, user_records
 
 
+@conditional_page(index_state)
+@cache_page_body(lambda request: pages.INDEX)
 def index(request):
-    post_list = Post.objects.select_related('group')
-    paginator = Paginator(post_list, settings.PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page, paginator = paginate(
+        request, post_list,
+        count=lambda: cached_count('all', Post.objects.all()))
     return render(
         request,
         'index.html',
@@ -20,19 +31,33 @@ def index(request):
     )
 
 
+@conditional_page(group_state)
+@cache_page_body(lambda request, slug: pages.group_section(slug))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page, paginator = paginate(
+        request, post_list,
+        count=lambda: cached_count(f'group:{group.pk}', group.posts.all()))
     return render(
         request,
         'group.html',
         {'group': group, 'page': page, 'paginator': paginator})
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_list = search_posts(query)
+    page, paginator = paginate(request, post_list.for_feed(), SEARCH_KEYS)
+    return render(
+        request,
+        'posts/search.html',
+        {'query': query, 'page': page, 'paginator': paginator}
+    )
+
+
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(
         request.POST or None,
@@ -49,40 +74,65 @@ def new_post(request):
         {'form': form, 'is_edit': False})
 
 
+@conditional_page(profile_state)
 def profile(request, username):
-    author = User.objects.get(username=username)
-    post_list_author = author.posts.all()
-    count_posts = post_list_author.count()
-    paginator = Paginator(post_list_author, settings.PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    counters = UserCounter.objects.for_user(author)
+    post_list_author = author.posts.for_feed()
+    page, paginator = paginate(
+        request, post_list_author, count=lambda: counters.posts_count)
     follow_check = (
         request.user.is_authenticated and
         Follow.objects.filter(
             user=request.user,
             author=author).exists()
     )
-    followers = author.following.count()
-    follows = author.follower.count()
 
     return render(
         request,
         'posts/profile.html',
         {'page': page,
          'author': author,
-         'count_posts': count_posts,
+         'count_posts': counters.posts_count,
          'paginator': paginator,
          'following': follow_check,
-         'follows': follows,
-         'followers': followers
+         'follows': counters.following_count,
+         'followers': counters.followers_count
          }
     )
 
 
+@login_required
+def profile_export(request, username):
+    """Все посты и комментарии автора одним потоком NDJSON или CSV."""
+    author = get_object_or_404(User, username=username)
+    if request.user != author:
+        return redirect(reverse(
+            'profile',
+            kwargs={'username': username}
+        ))
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in LINES:
+        return HttpResponseBadRequest('Формат: ndjson или csv')
+    response = StreamingHttpResponse(
+        LINES[fmt](user_records(author)),
+        content_type=CONTENT_TYPES[fmt]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.username}.{fmt}"')
+    return response
+
+
+@conditional_page(post_state)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
-    count_posts = post.author.posts.count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__counters'),
+        pk=post_id,
+        author__username=username
+    )
+    count_posts = UserCounter.objects.for_user(post.author).posts_count
+    comments = post.comments.select_related('author')
     form = CommentForm(request.POST or None)
     return render(
         request,
@@ -109,6 +159,8 @@ def post_edit(request, username, post_id):
     )
     if form.is_valid():
         post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            post.thumbnail_ready = False
         post.save()
         return redirect(reverse(
             'post',
@@ -121,6 +173,7 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
     form = CommentForm(request.POST or None)
@@ -137,10 +190,10 @@ def add_comment(request, username, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list, keys = follow_feed(request.user)
+    page, paginator = paginate(
+        request, post_list.for_feed(), keys,
+        count=lambda: cached_count(f'follow:{request.user.pk}', post_list))
     return render(
         request,
         'posts/follow.html',
@@ -151,18 +204,7 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (request.user == author) or (Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()):
-        return redirect(reverse(
-            'profile',
-            kwargs={'username': username}
-        ))
-    Follow.objects.create(
-        user=request.user,
-        author=author,
-    )
+    follows.follow(request.user, [author.pk])
     return redirect(reverse(
         'profile',
         kwargs={'username': username}
@@ -172,10 +214,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).delete()
+    follows.unfollow(request.user, [author.pk])
     return redirect(reverse(
         'profile',
         kwargs={'username': username}
@@ -0,0 +1,23 @@
+"""Настройка соединений SQLite из SQLITE_PRAGMAS.
+
+PRAGMA действуют на соединение, а не на файл базы (кроме
+journal_mode=wal, который запоминается в файле), поэтому они
+выполняются на каждом новом соединении по сигналу connection_created.
+Реплики открыты только на чтение: журнал у них выбирает основная
+база, и journal_mode к ним не применяется.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias in settings.DATABASE_REPLICAS:
+        pragmas.pop('journal_mode', None)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,286 @@
+"""Метрики запросов: число SQL-запросов, время БД, шаблонов и ответа.
+
+MetricsMiddleware складывает их по имени URL в гистограммы,
+metrics_view отдаёт их администраторам в текстовом формате Prometheus.
+Счётчики _bucket, _sum и _count накопительные, как того ждёт rate();
+квантили за последние METRICS_WINDOW_SLOTS * METRICS_SLOT_SECONDS
+секунд считаются отдельно, по скользящему окну, и отдаются
+gauge-метрикой <имя>_recent{quantile="0.95"}. Гистограммы живут в
+памяти процесса: каждый воркер отдаёт свои.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('yatube.slow_requests')
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+METRICS = {
+    'yatube_request_duration_seconds': TIME_BUCKETS,
+    'yatube_db_duration_seconds': TIME_BUCKETS,
+    'yatube_template_duration_seconds': TIME_BUCKETS,
+    'yatube_db_queries': QUERY_BUCKETS,
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+_request = threading.local()
+
+
+class Histogram:
+    """Накопительная гистограмма: счётчики только растут."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def snapshot(self):
+        """(накопленные счётчики по границам, сумма, количество)."""
+        with self.lock:
+            cumulative = list(accumulate(self.counts))
+            return cumulative, self.sum, cumulative[-1]
+
+
+class RollingHistogram:
+    """Гистограмма за последние slots * slot_seconds секунд.
+
+    Окно поделено на слоты; устаревший слот обнуляется при первой
+    записи в него, так что старые наблюдения выпадают сами.
+    """
+
+    def __init__(self, buckets, slots, slot_seconds):
+        self.buckets = buckets
+        self.slot_seconds = slot_seconds
+        self.slots = [self._empty(None) for _ in range(slots)]
+        self.lock = threading.Lock()
+
+    def _empty(self, epoch):
+        return {
+            'epoch': epoch,
+            'counts': [0] * (len(self.buckets) + 1),
+            'sum': 0.0,
+        }
+
+    def observe(self, value, now=None):
+        if now is None:
+            now = time.time()
+        epoch = int(now // self.slot_seconds)
+        index = epoch % len(self.slots)
+        with self.lock:
+            slot = self.slots[index]
+            if slot['epoch'] != epoch:
+                slot = self.slots[index] = self._empty(epoch)
+            slot['counts'][bisect_left(self.buckets, value)] += 1
+            slot['sum'] += value
+
+    def snapshot(self, now=None):
+        """(накопленные счётчики по границам, сумма, количество)."""
+        if now is None:
+            now = time.time()
+        oldest = int(now // self.slot_seconds) - len(self.slots) + 1
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        with self.lock:
+            for slot in self.slots:
+                if slot['epoch'] is None or slot['epoch'] < oldest:
+                    continue
+                counts = [a + b for a, b in zip(counts, slot['counts'])]
+                total += slot['sum']
+        cumulative = list(accumulate(counts))
+        return cumulative, total, cumulative[-1]
+
+    def quantile(self, share, now=None):
+        """Квантиль за окно с интерполяцией внутри корзины, как
+        histogram_quantile в Prometheus; None, если наблюдений нет."""
+        cumulative, _, count = self.snapshot(now)
+        if not count:
+            return None
+        rank = share * count
+        index = bisect_left(cumulative, rank)
+        if index == len(self.buckets):
+            return self.buckets[-1]
+        lower = self.buckets[index - 1] if index else 0
+        below = cumulative[index - 1] if index else 0
+        inside = cumulative[index] - below
+        return lower + (self.buckets[index] - lower) * (rank - below) / inside
+
+
+class Series:
+    """Метрика одного представления: накопительная и за окно."""
+
+    def __init__(self, buckets):
+        self.total = Histogram(buckets)
+        self.window = RollingHistogram(
+            buckets,
+            settings.METRICS_WINDOW_SLOTS,
+            settings.METRICS_SLOT_SECONDS,
+        )
+
+    def observe(self, value):
+        self.total.observe(value)
+        self.window.observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def histogram(self, metric, view):
+        with self.lock:
+            series = self.histograms[metric].get(view)
+            if series is None:
+                series = self.histograms[metric][view] = Series(
+                    METRICS[metric])
+            return series
+
+    def observe(self, view, **values):
+        for metric, value in values.items():
+            self.histogram(metric, view).observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        with self.lock:
+            histograms = {
+                metric: dict(views)
+                for metric, views in self.histograms.items()
+            }
+        for metric in METRICS:
+            views = sorted(histograms.get(metric, {}).items())
+            lines.append(f'# TYPE {metric} histogram')
+            for view, series in views:
+                cumulative, total, count = series.total.snapshot()
+                bounds = [str(bound) for bound in series.total.buckets]
+                for bound, value in zip(bounds + ['+Inf'], cumulative):
+                    lines.append(
+                        f'{metric}_bucket{{view="{view}",le="{bound}"}} '
+                        f'{value}')
+                lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+                lines.append(f'{metric}_count{{view="{view}"}} {count}')
+            lines.append(f'# TYPE {metric}_recent gauge')
+            for view, series in views:
+                for share in QUANTILES:
+                    value = series.window.quantile(share)
+                    if value is not None:
+                        lines.append(
+                            f'{metric}_recent{{view="{view}",'
+                            f'quantile="{share}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db_time += elapsed
+            self.queries.append((sql, elapsed))
+
+
+class TimedTemplate:
+    """Обёртка шаблона бэкенда, считающая время рендера в запросе."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = getattr(_request, 'stats', None)
+        if stats is None:
+            return self.template.render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, чьи шаблоны отчитываются MetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _request.stats = RequestStats()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            del _request.stats
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        registry.observe(
+            view,
+            yatube_request_duration_seconds=duration,
+            yatube_db_duration_seconds=stats.db_time,
+            yatube_template_duration_seconds=stats.template_time,
+            yatube_db_queries=len(stats.queries),
+        )
+        if duration >= settings.SLOW_REQUEST_SECONDS:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.3f с, %d SQL за %.3f с\n%s',
+                request.method, request.path, view, duration,
+                len(stats.queries), stats.db_time,
+                '\n'.join(
+                    f'{elapsed:.4f} {sql}' for sql, elapsed in stats.queries),
+            )
+        return response
+
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,131 @@
+"""Чтение лент с реплик базы данных.
+
+Реплики — алиасы из DATABASE_REPLICAS. ReplicaMiddleware отправляет
+на них чтения только тех представлений, чьи имена URL перечислены в
+REPLICA_VIEWS; все записи и остальные чтения идут в default.
+Реплика выбирается по кругу среди живых: раз в REPLICA_HEALTH_SECONDS
+она проверяется запросом SELECT 1, а упавшая пропускается до
+следующей проверки. Если живых нет, чтение идёт в default.
+
+Реплика отстаёт от основной базы, поэтому после любого POST, PUT,
+PATCH или DELETE браузер получает cookie PIN_COOKIE на
+REPLICA_PIN_SECONDS секунд: пока она жива, его запросы читают из
+default и автор сразу видит свой пост или комментарий.
+
+Сессия и пользователь читаются лениво уже внутри представления, но
+всегда из default (PRIMARY_MODELS): иначе после истечения cookie
+отставшая реплика могла бы не знать сессии и показать вошедшего
+пользователя анонимом.
+"""
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
+
+PIN_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_MODELS = ('sessions.session', 'auth.user')
+
+_state = threading.local()
+_turns = itertools.count()
+_health = {}
+_health_lock = threading.Lock()
+
+
+def is_healthy(alias):
+    """Жива ли реплика; результат проверки помнится на время процесса."""
+    now = time.monotonic()
+    with _health_lock:
+        healthy, checked = _health.get(alias, (None, 0))
+    if healthy is not None and now - checked < settings.REPLICA_HEALTH_SECONDS:
+        return healthy
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def mark_down(alias):
+    with _health_lock:
+        _health[alias] = (False, time.monotonic())
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+def choose_replica():
+    """Следующая по кругу живая реплика или None."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return None
+    start = next(_turns)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if is_healthy(alias):
+            return alias
+    return None
+
+
+def current_replica():
+    return getattr(_state, 'alias', None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return 'default'
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них можно связывать.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.alias = None
+        if (request.method not in SAFE_METHODS
+                and settings.DATABASE_REPLICAS
+                and response.status_code < 500):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS
+                and PIN_COOKIE not in request.COOKIES
+                and request.resolver_match.url_name
+                in settings.REPLICA_VIEWS):
+            _state.alias = choose_replica()
+
+    def process_exception(self, request, exception):
+        alias = current_replica()
+        if alias is not None and isinstance(exception, OperationalError):
+            mark_down(alias)
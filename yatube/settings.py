@@ -29,6 +29,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.template_profile.TemplateProfileMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,17 +39,31 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.pages.HoleMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Кэширующий загрузчик читает и разбирает шаблон один раз на процесс.
+# Включён по умолчанию без DEBUG (YATUBE_TEMPLATE_CACHE=0|1 решает
+# явно); при старте воркера wsgi.py прогревает все шаблоны.
+TEMPLATE_CACHE = os.environ.get(
+    'YATUBE_TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -67,6 +84,43 @@ DATABASES = {
     }
 }
 
+# YATUBE_DATABASE_PROFILE=production держит соединения открытыми
+# YATUBE_CONN_MAX_AGE секунд вместо переподключения на каждый запрос
+# и переводит SQLite в WAL: читатели не ждут писателя, а fsync идёт
+# при чекпойнте, а не на каждом коммите. PRAGMA выполняет
+# yatube.database на каждом новом соединении.
+DATABASE_PROFILE = os.environ.get('YATUBE_DATABASE_PROFILE', 'development')
+SQLITE_PRAGMAS = {}
+if DATABASE_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('YATUBE_CONN_MAX_AGE', 600))
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000,
+    }
+
+# Реплики только для чтения: YATUBE_DATABASE_REPLICAS — пути к копиям
+# базы через запятую, они становятся алиасами replica1, replica2...
+# SQLite открывает их в режиме mode=ro, так что запись в реплику
+# падает, а не расходится с основной базой.
+for number, path in enumerate(filter(None, os.environ.get(
+        'YATUBE_DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': f'file:{os.path.join(BASE_DIR, path.strip())}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+
+# Имена URL, которые читают с реплик; сколько секунд после записи
+# браузер читает из default; как часто перепроверять живость реплик.
+REPLICA_VIEWS = ('index', 'group_slug', 'profile', 'post', 'follow_index')
+REPLICA_PIN_SECONDS = 10
+REPLICA_HEALTH_SECONDS = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,10 +163,103 @@ LOGIN_REDIRECT_URL = 'index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Кэш выбирается переменными окружения, чтобы воркеры gunicorn могли
+# делить один общий кэш: YATUBE_CACHE_BACKEND=locmem|file|memcached|redis,
+# YATUBE_CACHE_LOCATION — каталог или адрес сервера. Смена
+# YATUBE_CACHE_VERSION разом инвалидирует все ключи.
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get('YATUBE_CACHE_LOCATION')
+CACHE_POOL_SIZE = int(os.environ.get('YATUBE_CACHE_POOL_SIZE', 50))
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+    },
+    'memcached': {
+        # pylibmc держит одно постоянное соединение на поток. Ставится
+        # из requirements-cache.txt, нужен libmemcached.
+        'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+        'LOCATION': CACHE_LOCATION or '127.0.0.1:11211',
+        'OPTIONS': {
+            'binary': True,
+            'behaviors': {'tcp_nodelay': True, 'ketama': True},
+        },
+    },
+    'redis': {
+        # Требует пакет django-redis из requirements-cache.txt.
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CONNECTION_POOL_KWARGS': {'max_connections': CACHE_POOL_SIZE},
+        },
+    },
+}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': os.environ.get('YATUBE_CACHE_PREFIX', 'yatube'),
+        'VERSION': int(os.environ.get('YATUBE_CACHE_VERSION', 1)),
     }
 }
 
 PER_PAGE = 10
+# Сколько секунд число постов для номеров страниц может отставать.
+PAGINATOR_COUNT_TIMEOUT = 60
+API_MAX_PAGE_SIZE = 100
+# Сколько имён можно передать за раз в api/v1/follow/authors/.
+API_MAX_FOLLOW_BATCH = 500
+
+# Лента подписок материализуется при публикации поста. Посты авторов,
+# у которых подписчиков не меньше FEED_FANOUT_LIMIT, не раскладываются
+# по лентам, а подмешиваются при чтении.
+FOLLOW_FEED_MATERIALIZED = True
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 1000
+
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Тела лент сбрасываются сигналами; срок лишь ограничивает устаревание,
+# если у воркеров нет общего кэша. 0 отключает кэш страниц.
+PAGE_CACHE_TIMEOUT = int(os.environ.get('YATUBE_PAGE_CACHE_TIMEOUT', 60))
+
+# Сколько секунд CDN или обратный прокси может отдавать анонимам
+# страницу ленты, не перепроверяя её у нас.
+EDGE_CACHE_SECONDS = int(os.environ.get('YATUBE_EDGE_CACHE_SECONDS', 30))
+
+# Очередь задач (posts.tasks): thread — в пуле потоков после коммита,
+# database — воркером manage.py process_tasks, immediate — сразу
+# в запросе. Повторы упавших задач выполняет process_tasks и при
+# thread. Тесты переключаются на immediate в yatube.testing.
+TASK_BACKEND = os.environ.get('YATUBE_TASK_BACKEND', 'thread')
+TEST_RUNNER = 'yatube.testing.TestRunner'
+TASK_WORKERS = int(os.environ.get('YATUBE_TASK_WORKERS', 2))
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_LOCK_TIMEOUT = 60 * 10
+
+# Дайджесты уведомлений: писем за одно SMTP-соединение и сколько дней
+# хранить уже отправленные события.
+DIGEST_BATCH_SIZE = 100
+NOTIFICATION_RETENTION_DAYS = 30
+
+# Метрики запросов отдаются на /metrics/ и копятся в скользящем окне
+# из METRICS_WINDOW_SLOTS слотов по METRICS_SLOT_SECONDS секунд.
+METRICS_WINDOW_SLOTS = 10
+METRICS_SLOT_SECONDS = 60
+SLOW_REQUEST_SECONDS = float(os.environ.get('YATUBE_SLOW_REQUEST_SECONDS', 1))
+
+# Профиль рендера шаблонов по include и block на /metrics/templates/.
+# Подменяет render у узлов шаблонов, поэтому по умолчанию выключен.
+TEMPLATE_PROFILING = os.environ.get('YATUBE_TEMPLATE_PROFILING') == '1'
+
+# Бюджет импорта yatube.wsgi при старте воркера (manage.py
+# profile_imports) и модули, которые должны грузиться лениво — при
+# первой нарезке миниатюры, а не при старте.
+STARTUP_IMPORT_BUDGET_MS = int(
+    os.environ.get('YATUBE_STARTUP_IMPORT_BUDGET_MS', 1000))
+STARTUP_LAZY_MODULES = ('PIL', 'sorl.thumbnail.engines')
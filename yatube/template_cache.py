@@ -0,0 +1,104 @@
+"""Прогрев и проверка шаблонов при старте воркера.
+
+С кэширующим загрузчиком (TEMPLATE_CACHE) шаблон читается с диска и
+разбирается один раз на процесс, но этот раз приходится на первый
+запрос после деплоя. warm() заранее загружает все шаблоны проекта —
+templates/ и каталоги templates приложений — и заодно проверяет их:
+синтаксические ошибки и {% extends %}/{% include %} несуществующих
+шаблонов всплывают при старте, а не у пользователя.
+"""
+import os
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.template.loaders import cached
+
+
+def django_engines():
+    return [
+        backend.engine for backend in engines.all()
+        if hasattr(backend, 'engine')
+    ]
+
+
+def leaf_loaders(engine):
+    for loader in engine.template_loaders:
+        yield from getattr(loader, 'loaders', [loader])
+
+
+def template_dirs(engine, everything=False):
+    """Каталоги шаблонов в порядке загрузчиков.
+
+    По умолчанию только каталоги проекта; с everything — и сторонних
+    приложений вроде админки.
+    """
+    dirs = []
+    for loader in leaf_loaders(engine):
+        for directory in loader.get_dirs():
+            directory = str(directory)
+            if directory in dirs or not os.path.isdir(directory):
+                continue
+            if everything or directory.startswith(settings.BASE_DIR):
+                dirs.append(directory)
+    return dirs
+
+
+def template_names(engine, everything=False):
+    names = set()
+    for directory in template_dirs(engine, everything):
+        for root, subdirs, files in os.walk(directory):
+            subdirs[:] = [name for name in subdirs if not name.startswith('.')]
+            for name in files:
+                if not name.startswith('.'):
+                    path = os.path.join(root, name)
+                    names.add(os.path.relpath(path, directory).replace(
+                        os.sep, '/'))
+    return sorted(names)
+
+
+def referenced_names(template):
+    """Шаблоны, заданные строкой в {% extends %} и {% include %}."""
+    for node in template.nodelist.get_nodes_by_type(ExtendsNode):
+        if isinstance(node.parent_name.var, str):
+            yield node.parent_name.var
+    for node in template.nodelist.get_nodes_by_type(IncludeNode):
+        if isinstance(node.template.var, str):
+            yield node.template.var
+
+
+def reset(engine):
+    """Очищает кэширующие загрузчики: следующий рендер будет холодным."""
+    for loader in engine.template_loaders:
+        loader.reset()
+
+
+def is_cached(engine):
+    return any(
+        isinstance(loader, cached.Loader)
+        for loader in engine.template_loaders)
+
+
+def warm(everything=False):
+    """Загружает все шаблоны; возвращает (число, [(шаблон, ошибка)]).
+
+    Ссылки {% extends %} и {% include %} проверяются только у шаблонов
+    проекта: сторонние, например виджеты админки, подключают шаблоны
+    рендерера форм, которых в каталогах движка нет.
+    """
+    loaded = 0
+    errors = []
+    for engine in django_engines():
+        own = set(template_names(engine))
+        names = template_names(engine, True) if everything else sorted(own)
+        for name in names:
+            try:
+                template = engine.get_template(name)
+                if name in own:
+                    for reference in referenced_names(template):
+                        engine.get_template(reference)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as error:
+                errors.append((name, f'{type(error).__name__}: {error}'))
+            else:
+                loaded += 1
+    return loaded, errors
@@ -0,0 +1,196 @@
+"""Профиль рендера шаблонов по {% include %} и {% block %}.
+
+Включается YATUBE_TEMPLATE_PROFILING=1: TemplateProfileMiddleware
+подменяет render у Template, BlockNode и ExtendsNode и в каждом
+запросе замеряет стек вложенных шаблонов и блоков. Собственное время
+каждого стека копится в процессе по всем запросам и отдаётся
+администраторам на /metrics/templates/ в формате collapsed stacks:
+его понимают flamegraph.pl, speedscope и inferno. С ?format=summary
+там же таблица по шаблонам: сколько раз, общее и собственное время.
+
+Без профилирования мидлварь отключается и рендер не меняется.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template.base import Template
+from django.template.loader_tags import BlockNode, ExtendsNode
+
+_request = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+
+class Frame:
+    __slots__ = ('label', 'started', 'children')
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.children = 0.0
+
+
+class Recording:
+    """Профиль одного запроса: стек открытых кадров и их времена."""
+
+    def __init__(self, active=True):
+        self.active = active
+        self.frames = []
+        self.stacks = Counter()
+        self.templates = defaultdict(lambda: [0, 0.0, 0.0])
+
+    @contextmanager
+    def frame(self, label):
+        frames = self.frames
+        current = Frame(label)
+        frames.append(current)
+        try:
+            yield
+        finally:
+            frames.pop()
+            elapsed = time.perf_counter() - current.started
+            if frames:
+                frames[-1].children += elapsed
+            labels = [item.label for item in frames]
+            own = elapsed - current.children
+            self.stacks[';'.join(labels + [label])] += own
+            entry = self.templates[label]
+            entry[0] += 1
+            entry[2] += own
+            # Рекурсивный шаблон не считаем в общем времени дважды.
+            if label not in labels:
+                entry[1] += elapsed
+
+
+class TemplateProfile:
+    """Накопленный профиль: время по стекам и по шаблонам, в секундах."""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.templates = defaultdict(lambda: [0, 0.0, 0.0])
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def merge(self, view, recording):
+        if not recording.active:
+            return
+        with self.lock:
+            self.requests += 1
+            for stack, seconds in recording.stacks.items():
+                self.stacks[f'{view};{stack}'] += seconds
+            for label, (count, total, own) in recording.templates.items():
+                entry = self.templates[label]
+                entry[0] += count
+                entry[1] += total
+                entry[2] += own
+
+    def clear(self):
+        with self.lock:
+            self.stacks.clear()
+            self.templates.clear()
+            self.requests = 0
+
+    def collapsed(self):
+        """Строки «кадр;кадр;кадр микросекунды» для flame graph."""
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return ''.join(
+            f'{stack} {round(seconds * 1e6)}\n'
+            for stack, seconds in stacks if round(seconds * 1e6))
+
+    def summary(self):
+        with self.lock:
+            requests = self.requests
+            rows = sorted(
+                self.templates.items(), key=lambda item: -item[1][2])
+        lines = [
+            f'Запросов: {requests}',
+            f'{"собств., мс":>12} {"всего, мс":>12} {"раз":>8}  шаблон',
+        ]
+        for label, (count, total, own) in rows:
+            lines.append(
+                f'{own * 1000:12.2f} {total * 1000:12.2f} {count:8d}  '
+                f'{label}')
+        return '\n'.join(lines) + '\n'
+
+
+profile = TemplateProfile()
+
+
+def timed(render, label):
+    @wraps(render)
+    def wrapper(self, context):
+        recording = getattr(_request, 'recording', None)
+        if recording is None:
+            return render(self, context)
+        with recording.frame(label(self)):
+            return render(self, context)
+    return wrapper
+
+
+def install():
+    """Подменяет render у узлов шаблонов; повторный вызов ничего не делает."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        Template.render = timed(
+            Template.render, lambda template: template.name or '<строка>')
+        BlockNode.render = timed(
+            BlockNode.render, lambda node: f'block {node.name}')
+        ExtendsNode.render = timed(
+            ExtendsNode.render,
+            lambda node: f'extends {node.parent_name.var}')
+        _installed = True
+
+
+@contextmanager
+def collect():
+    """Записывает шаблоны, отрисованные внутри блока, в Recording.
+
+    Во вложенном collect() запись не ведётся: кадры достаются внешнему.
+    """
+    install()
+    if getattr(_request, 'recording', None) is not None:
+        yield Recording(active=False)
+        return
+    recording = _request.recording = Recording()
+    try:
+        yield recording
+    finally:
+        _request.recording = None
+
+
+class TemplateProfileMiddleware:
+    def __init__(self, get_response):
+        if not settings.TEMPLATE_PROFILING:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect() as recording:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        profile.merge(view, recording)
+        return response
+
+
+@staff_member_required
+def template_profile_view(request):
+    if request.GET.get('format') == 'summary':
+        return HttpResponse(
+            profile.summary(), content_type='text/plain; charset=utf-8')
+    response = HttpResponse(
+        profile.collapsed(), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = (
+        'attachment; filename="templates.folded"')
+    return response
@@ -0,0 +1,22 @@
+"""Настройки, общие для всех тестов: manage.py test и pytest.
+
+Тесты не коммитят транзакцию, и задачи, отложенные до коммита, в них
+не выполнились бы, поэтому задачи там идут сразу, в том же запросе.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {
+    'TASK_BACKEND': 'immediate',
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -4,11 +4,19 @@ from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 from django.urls import include, path
 
+from .metrics import metrics_view
+from .template_profile import template_profile_view
+
 urlpatterns = [
     path('administrate/', admin.site.urls, name='admin_path'),
+    path('metrics/', metrics_view, name='metrics'),
+    path(
+        'metrics/templates/', template_profile_view,
+        name='template_profile'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('', include('posts.urls')),
 ]
 
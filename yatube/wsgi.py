@@ -1,7 +1,26 @@
+import logging
 import os
+import sys
 
-from django.core.wsgi import get_wsgi_application
+# Django 2.2 берёт версию через distutils, а подмена distutils из
+# setuptools тянет при старте воркера весь setuptools. Стандартного
+# distutils Django хватает; замер — manage.py profile_imports. В
+# Python 3.12 стандартного distutils нет, и там подмена нужна.
+if sys.version_info < (3, 12):
+    os.environ.setdefault('SETUPTOOLS_USE_DISTUTILS', 'stdlib')
+
+from django.conf import settings  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.TEMPLATE_CACHE:
+    # Прогрев при старте воркера: первый запрос после деплоя не ждёт
+    # чтения и разбора шаблонов.
+    from .template_cache import warm
+
+    for name, error in warm()[1]:
+        logging.getLogger('yatube.templates').error(
+            'Шаблон %s не загрузился: %s', name, error)